@@ -4,17 +4,28 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from PIL import Image
-import google.generativeai as genai
-import PyPDF2
 import io
 import json
 import os
 from dotenv import load_dotenv
-import fitz
-from PIL import Image
 import io
-import tempfile
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from src.backend.export import (
+    available_compressions,
+    available_formats,
+    export_reports,
+    file_name,
+)
+from src.backend.models.analysis import text_page_inputs
+from src.backend.models.cascade import tier_stats
+from src.backend.models.gemini_client import configure, get_config
+from src.backend.models.hedging import Deadline
+from src.backend.models.image_ranking import select_images
+from src.backend.models.mapreduce import group_pages, run_pages
+from src.backend.models.pdf_handler import extract_pdf
+from src.backend.models.prompts import TEXT_PROMPTS
+from src.backend.models.usage import ReportUsage, daily_ledger
 
 # .envファイルの読み込み
 load_dotenv()
@@ -50,93 +61,47 @@ st.markdown(
 
 # API-KEYの設定
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
+# 記録済み応答の再生モード（GEMINI_CASSETTE_MODE=replay）ではAPIキーは不要
+if not GEMINI_API_KEY and os.getenv("GEMINI_CASSETTE_MODE") != "replay":
     st.error(
         "APIキーが設定されていません。.envファイルにGEMINI_API_KEYを設定してください。"
     )
     st.stop()
 
-genai.configure(api_key=GEMINI_API_KEY)
+# クライアントの設定（プロセス内で共有し、GEMINI_WARMUP=1で起動時にウォームアップ）
+configure()
 
-# モデルの設定
-model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash",
-    generation_config={"response_mime_type": "application/json"},
-)
+# 分析結果を保持するセッションキー
+REPORT_STATE_KEY = "analysis_report"
 
+# ダウンロードの出力形式の表示名
+EXPORT_FORMAT_LABELS = {
+    "json": "JSON（全体）",
+    "jsonl": "JSONL",
+    "csv": "CSV（スコア表）",
+    "parquet": "Parquet（スコア表）",
+}
 
-def extract_text_from_pdf(pdf_file):
-    """PDFからテキストを抽出"""
-    try:
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text
-    except Exception as e:
-        st.error(f"PDFの解析中にエラーが発生しました: {str(e)}")
-        return None
+# レポートに表示する代表画像の最大数
+REPRESENTATIVE_IMAGE_COUNT = 4
 
 
-def display_pdf_images(image_bytes):
-    """PDFから抽出した画像を表示"""
-    if image_bytes and len(image_bytes) > 0:  # 画像が存在することを確認
-        st.divider()
-        st.subheader("📸 分析対象の画像")
-
-        # 画像の表示サイズ設定
-        display_width = st.slider(
-            "画像の表示サイズ",
-            min_value=300,
-            max_value=1200,
-            value=800,
-            step=100,
-            key="image_size_slider",  # ユニークなキーを追加
-        )
-
-        for idx, img_bytes in enumerate(image_bytes):
-            try:
-                image = Image.open(io.BytesIO(img_bytes))
-                st.image(image, caption=f"画像 {idx + 1}", width=display_width)
-
-                with st.expander(f"画像 {idx + 1} の詳細情報"):
-                    st.write(f"元のサイズ: {image.size[0]} x {image.size[1]}")
-                    st.write(f"フォーマット: {image.format}")
-                    st.write(f"モード: {image.mode}")
-            except Exception as e:
-                st.error(f"画像 {idx + 1} の表示中にエラーが発生しました: {str(e)}")
-    else:
-        st.info("画像が見つかりませんでした")
-
-
-def display_analysis_images(image_bytes, title="📸 分析対象画像"):
-    """分析に使用した画像を表示（image_infoの順序で表示）"""
-    if image_bytes and len(image_bytes) > 0:
+def display_analysis_images(images, title="📸 分析対象画像"):
+    """分析に使用した代表画像を表示（スコアの高い順）"""
+    if images:
         st.divider()
         st.subheader(title)
 
-        # 表示する画像の情報
-        image_info = [
-            {
-                "page": 3,
-                "number": 2,
-                "index": 1,
-            },  # indexは画像のインデックス（0から始まる）
-            {"page": 1, "number": 1, "index": 0},
-        ]
-
-        # 2つのカラムを作成
-        cols = st.columns(2)
-
-        # image_infoの順序で画像を表示
-        for idx, info in enumerate(image_info):
-            with cols[idx]:
+        # 2列で表示
+        cols = st.columns(min(len(images), 2))
+        for idx, image_info in enumerate(images):
+            with cols[idx % 2]:
                 try:
-                    image = Image.open(io.BytesIO(image_bytes[info["index"]]))
+                    # バイト列をそのまま渡す（デコード・再エンコードはStreamlitが必要な場合のみ行う）
                     st.image(
-                        image,
-                        caption=f"ページ: {info['page']}, 画像番号: {info['number']}",
-                        use_column_width=True,
+                        image_info.data,
+                        caption=f"ページ: {image_info.page}, 画像番号: {image_info.number}",
+                        width="stretch",
                     )
                 except Exception as e:
                     st.error(f"画像の表示中にエラーが発生しました: {str(e)}")
@@ -144,206 +109,35 @@ def display_analysis_images(image_bytes, title="📸 分析対象画像"):
         st.info("分析対象の画像が見つかりませんでした")
 
 
-# PDFから画像を抽出する関数の修正
-def extract_image_bytes(pdf_file) -> list[bytes]:
-    """PDFから画像をバイト列のリストとして抽出"""
-    extract_bytes = []
+def extract_pdf_content(pdf_file):
+    """PDFからページごとのテキストと代表画像を抽出
+
+    アップロードされたファイルのバッファから直接読み込み、PDF全体をコピーしない。
+    代表画像はアイコン・罫線・繰り返しのロゴを除いてスコアの高い順に選ぶ。
+    """
     try:
-        # アップロードされたファイルを一時的に保存
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-            temp_pdf.write(pdf_file.getvalue())
-            temp_path = temp_pdf.name
-
-        # 保存したファイルを開く
-        pdf_doc = fitz.open(temp_path)
-
-        for page in pdf_doc:
-            for image in page.get_images():
-                xref = image[0]
-                base_image = pdf_doc.extract_image(xref)
-                if base_image:
-                    extract_bytes.append(base_image["image"])
-
-        # クリーンアップ
-        pdf_doc.close()
-        os.unlink(temp_path)
-        return extract_bytes
+        content = extract_pdf(pdf_file)
     except Exception as e:
-        st.error(f"画像の抽出中にエラーが発生しました: {str(e)}")
-        return []
-
-
-def analyze_with_gemini(text, analysis_type):
-    """Geminiを使用して広告分析を実行"""
-    prompts = {
-        "visual_analysis": """
-        以下の広告分析テキストから、視覚的な要素（レイアウト、注目ポイント、視線の流れなど）について分析してください。
-        専門家の視点で分析し、具体的な数値やエビデンスを含めて説明してください。
-
-        JSON形式で返答してください：
-        {
-            "key_points": ["主要なポイント1", "主要なポイント2", ...],
-            "attention_areas": ["注目エリア1", "注目エリア2", ...],
-            "attention_flow": {
-                "first_view": "最初に目が行く場所",
-                "second_view": "次に目が行く場所",
-                "final_view": "最後に目が行く場所"
-            },
-            "effectiveness_score": 0-100の数値,
-            "element_scores": {
-                "layout": 0-100の数値,
-                "hierarchy": 0-100の数値,
-                "visibility": 0-100の数値
-            },
-            "recommendations": ["改善提案1", "改善提案2", ...]
-        }
+        st.error(f"PDFの解析中にエラーが発生しました: {str(e)}")
+        return [], []
+    return content.page_texts, select_images(
+        content.images, REPRESENTATIVE_IMAGE_COUNT
+    )
 
-        分析テキスト:
-        """,
-        "color_analysis": """
-        以下の広告分析テキストから、色使いについて詳細に分析してください。
-        色彩心理学の観点から、各色の効果や印象も含めて説明してください。
-
-        JSON形式で返答してください：
-        {
-            "dominant_colors": [
-                {"color": "色名", "percentage": 数値, "psychological_effect": "心理的効果"},
-                ...
-            ],
-            "color_scheme": {
-                "type": "配色タイプ",
-                "effectiveness": 0-100の数値,
-                "harmony_description": "調和の説明"
-            },
-            "psychological_effects": ["効果1", "効果2", ...],
-            "target_audience_impact": {
-                "age_groups": ["対象年齢層への効果"],
-                "gender_appeal": ["性別ごとの訴求力"],
-                "cultural_factors": ["文化的な影響"]
-            },
-            "color_harmony_score": 0-100の数値,
-            "suggestions": ["提案1", "提案2", ...]
-        }
 
-        分析テキスト:
-        """,
-        "overall_impression": """
-        以下の広告分析テキストから、全体的な印象を総合的に分析してください。
-        マーケティング効果や消費者心理の観点から深く分析してください。
-
-        JSON形式で返答してください：
-        {
-            "impressions": [
-                {"aspect": "側面", "score": 0-100の数値, "description": "詳細説明"},
-                ...
-            ],
-            "target_audience": {
-                "primary": ["主要ターゲット1", "主要ターゲット2"],
-                "secondary": ["副次ターゲット1", "副次ターゲット2"],
-                "engagement_level": 0-100の数値
-            },
-            "strengths": ["強み1", "強み2", ...],
-            "weaknesses": ["弱み1", "弱み2", ...],
-            "market_fit": {
-                "score": 0-100の数値,
-                "reasons": ["理由1", "理由2"]
-            },
-            "overall_score": 0-100の数値,
-            "future_potential": ["将来性1", "将来性2"]
-        }
-        
-        分析テキスト:
-        """,
-    }
+# 分析中に表示するステータス
+ANALYSIS_STATUS = {
+    "visual_analysis": "視覚要素を分析中...",
+    "color_analysis": "色彩を分析中...",
+    "overall_impression": "全体的な印象を分析中...",
+    "marketing_analysis": "マーケティング戦略を分析中...",
+}
 
-    try:
-        response = model.generate_content(prompts[analysis_type] + text)
-        return json.loads(response.text)
-    except Exception as e:
-        st.error(f"Geminiの分析中にエラーが発生しました: {str(e)}")
-        return None
-
-
-def analyze_marketing_strategy(text):
-    """マーケティング戦略の分析を実行"""
-    prompt = """
-    以下の広告分析テキストから、マーケティング戦略について包括的に分析してください。
-    マーケティング4P、消費者行動分析、競合分析の観点から詳細な分析と実践的な示唆を提供してください。
-
-    JSON形式で返答してください：
-    {
-        "marketing_4p": {
-            "product": {
-                "current_status": "現状の分析",
-                "competitive_position": "競合との比較",
-                "suggestions": ["提案1", "提案2"]
-            },
-            "price": {
-                "current_status": "現状の分析",
-                "market_positioning": "市場での位置づけ",
-                "suggestions": ["提案1", "提案2"]
-            },
-            "place": {
-                "current_status": "現状の分析",
-                "channel_effectiveness": "チャネルの有効性",
-                "suggestions": ["提案1", "提案2"]
-            },
-            "promotion": {
-                "current_status": "現状の分析",
-                "communication_effectiveness": "コミュニケーション効果",
-                "suggestions": ["提案1", "提案2"]
-            }
-        },
-        "consumer_journey": {
-            "awareness": {
-                "score": 0-100の数値,
-                "touchpoints": ["接点1", "接点2"],
-                "insights": ["インサイト1", "インサイト2"]
-            },
-            "consideration": {
-                "score": 0-100の数値,
-                "decision_factors": ["要因1", "要因2"],
-                "insights": ["インサイト1", "インサイト2"]
-            },
-            "purchase": {
-                "score": 0-100の数値,
-                "triggers": ["トリガー1", "トリガー2"],
-                "insights": ["インサイト1", "インサイト2"]
-            }
-        },
-        "competitive_analysis": {
-            "market_position": "市場での位置づけ",
-            "unique_selling_points": ["USP1", "USP2"],
-            "threat_level": 0-100の数値,
-            "opportunities": ["機会1", "機会2"]
-        },
-        "actionable_insights": [
-            {
-                "insight": "示唆1",
-                "priority": 0-100の数値,
-                "expected_impact": "期待される効果"
-            },
-            ...
-        ],
-        "next_steps": [
-            {
-                "action": "次のステップ1",
-                "timeline": "実施時期",
-                "expected_outcome": "期待される結果"
-            },
-            ...
-        ]
-    }
 
-    分析テキスト:
-    """
-
-    try:
-        response = model.generate_content(prompt + text)
-        return json.loads(response.text)
-    except Exception as e:
-        st.error(f"マーケティング分析中にエラーが発生しました: {str(e)}")
-        return None
+def get_session_id():
+    """StreamlitのセッションID（トークン使用量の集計用）"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else None
 
 
 def display_visual_analysis(analysis):
@@ -429,7 +223,18 @@ def display_color_analysis(analysis):
             st.write(f"- {factor}")
 
 
-def display_marketing_analysis(analysis):
+@st.cache_data(show_spinner=False)
+def build_consumer_journey_figure(journey_scores):
+    """消費者行動スコアのグラフを生成（スコアが同じ間は再利用）"""
+    journey_df = pd.DataFrame(
+        [{"stage": stage, "score": score} for stage, score in journey_scores]
+    )
+    return px.bar(
+        journey_df, x="stage", y="score", title="消費者行動スコア", range_y=[0, 100]
+    )
+
+
+def display_marketing_analysis(analysis, chart_key=None):
     """マーケティング分析結果の表示"""
     if not analysis:
         return
@@ -455,15 +260,12 @@ def display_marketing_analysis(analysis):
     st.subheader("👥 消費者行動分析")
 
     # スコアの表示
-    journey_data = []
-    for stage, data in analysis["consumer_journey"].items():
-        journey_data.append({"stage": stage.capitalize(), "score": data["score"]})
-
-    journey_df = pd.DataFrame(journey_data)
-    fig = px.bar(
-        journey_df, x="stage", y="score", title="消費者行動スコア", range_y=[0, 100]
+    journey_scores = tuple(
+        (stage.capitalize(), data["score"])
+        for stage, data in analysis["consumer_journey"].items()
     )
-    st.plotly_chart(fig, use_container_width=True)
+    fig = build_consumer_journey_figure(journey_scores)
+    st.plotly_chart(fig, width="stretch", key=chart_key)
 
     # 競合分析
     st.subheader("🏢 競合分析")
@@ -545,119 +347,216 @@ def display_overall_impression(analysis):
         st.info(potential)
 
 
-# 画像表示用の新しい関数
-def display_pdf_images(image_bytes):
-    """PDFから抽出した画像を表示"""
-    if image_bytes:
-        st.divider()
-        st.subheader("📸 分析対象の画像")
+def display_page_drilldown(analysis_type, pages, display_analysis):
+    """ページ別の分析結果の表示（複数ページのPDFのみ）"""
+    if len(pages) < 2:
+        return
 
-        # 画像の表示サイズ設定
-        display_width = st.slider(
-            "画像の表示サイズ", min_value=300, max_value=1200, value=800, step=100
+    with st.expander("📄 ページ別の結果"):
+        labels = [page["label"] for page in pages]
+        label = st.selectbox(
+            "ページ",
+            labels,
+            format_func=lambda label: f"ページ {label}",
+            key=f"{analysis_type}_page",
         )
+        page = pages[labels.index(label)]
+        if analysis_type in page["errors"]:
+            st.warning(page["errors"][analysis_type])
+        if page["results"].get(analysis_type):
+            display_analysis(page["results"][analysis_type])
+
+
+# 各タブはフラグメントとして描画し、タブ内の操作ではそのタブだけを再実行する
+@st.fragment
+def display_overall_tab(images, overall_impression, pages):
+    """総合評価タブの表示"""
+    st.header("総合評価")
+    if overall_impression:
+        display_analysis_images(images)  # 共通の画像表示
+        display_overall_impression(overall_impression)
+    display_page_drilldown("overall_impression", pages, display_overall_impression)
+
+
+@st.fragment
+def display_visual_tab(images, visual_analysis, pages):
+    """視覚分析タブの表示"""
+    st.header("視覚要素の分析")
+    display_analysis_images(images)  # 共通の画像表示
+    display_visual_analysis(visual_analysis)
+    display_page_drilldown("visual_analysis", pages, display_visual_analysis)
+
+
+@st.fragment
+def display_color_tab(images, color_analysis, pages):
+    """色彩分析タブの表示"""
+    st.header("色彩分析")
+    display_analysis_images(images)  # 共通の画像表示
+    display_color_analysis(color_analysis)
+    display_page_drilldown("color_analysis", pages, display_color_analysis)
+
+
+@st.fragment
+def display_marketing_tab(images, marketing_analysis, pages):
+    """マーケティング分析タブの表示"""
+    st.header("マーケティング分析")
+    display_analysis_images(images)  # 共通の画像表示
+    display_marketing_analysis(marketing_analysis)
+    display_page_drilldown(
+        "marketing_analysis",
+        pages,
+        lambda analysis: display_marketing_analysis(
+            analysis, chart_key="consumer_journey_page"
+        ),
+    )
 
-        for idx, img_bytes in enumerate(image_bytes):
-            try:
-                image = Image.open(io.BytesIO(img_bytes))
-                # アスペクト比を維持しながらリサイズ
-                aspect_ratio = image.size[1] / image.size[0]
-                display_height = int(display_width * aspect_ratio)
-
-                # 画像をリサイズして表示
-                st.image(image, caption=f"画像 {idx + 1}", width=display_width)
-
-                # 画像の情報を表示
-                with st.expander(f"画像 {idx + 1} の詳細情報"):
-                    st.write(f"元のサイズ: {image.size[0]} x {image.size[1]}")
-                    st.write(f"フォーマット: {image.format}")
-                    st.write(f"モード: {image.mode}")
-            except Exception as e:
-                st.error(f"画像 {idx + 1} の表示中にエラーが発生しました: {str(e)}")
-
-
-# 画像表示関数を分析タイプごとに分ける
-def display_visual_analysis_image(image_bytes):
-    """視覚分析用の画像表示"""
-    if image_bytes and len(image_bytes) > 0:
-        st.divider()
-        st.subheader("👁️ 視覚分析に使用した画像")
 
-        cols = st.columns(len(image_bytes))
-        for idx, img_bytes in enumerate(image_bytes):
-            with cols[idx]:
-                try:
-                    image = Image.open(io.BytesIO(img_bytes))
-                    st.image(image, caption="視覚要素の分析対象", use_column_width=True)
+def display_token_usage(usage):
+    """レポートのトークン使用量の表示"""
+    with st.expander("🔢 トークン使用量"):
+        cols = st.columns(3)
+        with cols[0]:
+            st.metric("入力トークン", f"{usage['prompt_tokens']:,}")
+        with cols[1]:
+            st.metric("出力トークン", f"{usage['output_tokens']:,}")
+        with cols[2]:
+            st.metric("合計", f"{usage['total_tokens']:,}")
+
+        usage_df = pd.DataFrame.from_dict(usage["by_analysis"], orient="index")
+        st.dataframe(usage_df, width="stretch")
+        if usage["degradations"]:
+            st.info("予算に応じた調整: " + ", ".join(usage["degradations"]))
+
+
+# レポートのタブ（分析タイプ・ラベル・表示関数）
+REPORT_TABS = [
+    ("overall_impression", "📊 総合評価", display_overall_tab),
+    ("visual_analysis", "👁️ 視覚分析", display_visual_tab),
+    ("color_analysis", "🎨 色彩分析", display_color_tab),
+    ("marketing_analysis", "📈 マーケティング分析", display_marketing_tab),
+]
+ANALYSIS_LABELS = {analysis_type: label for analysis_type, label, _ in REPORT_TABS}
+
+
+def run_lazy_analysis(report, analysis_type):
+    """未実行の分析（または再分析を指示された分析）を実行し、結果をセッションに保存"""
+    report["attempted"].add(analysis_type)
+    with st.spinner(ANALYSIS_STATUS[analysis_type]):
+        result = run_pages(
+            TEXT_PROMPTS,
+            report["page_groups"],
+            analysis_types=(analysis_type,),
+            deadline=Deadline(get_config().report_timeout),
+            usage=report["usage_tracker"],
+        )
+    # 前回の失敗（統合リクエストの不完全な結果など）は今回の結果で置き換える
+    report["errors"].pop(analysis_type, None)
+    report["results"].update(result["results"])
+    report["errors"].update(result["errors"])
+    report["usage"] = result["usage"]
+    for page, page_result in zip(report["pages"], result["pages"]):
+        page["errors"].pop(analysis_type, None)
+        page["results"].update(page_result["results"])
+        page["errors"].update(page_result["errors"])
+
+
+def default_tab(results):
+    """最初に開くタブ（事前に分析済みのタブを開き、表示までに追加の分析を待たせない）"""
+    return next(
+        (
+            label
+            for analysis_type, label, _ in REPORT_TABS
+            if results.get(analysis_type) is not None
+        ),
+        None,
+    )
 
-                    with st.expander("画像詳細"):
-                        st.write(f"サイズ: {image.size[0]} x {image.size[1]}")
-                except Exception as e:
-                    st.error(f"画像の表示中にエラーが発生しました: {str(e)}")
 
+def display_report(report):
+    """保存済みの分析結果からレポートを表示（未実行の分析はタブを開いたときに実行）"""
+    images = report["images"]
 
-def display_color_analysis_image(image_bytes):
-    """色彩分析用の画像表示"""
-    if image_bytes and len(image_bytes) > 0:
-        st.divider()
-        st.subheader("🎨 色彩分析に使用した画像")
-
-        # 画像の表示サイズ設定
-        display_width = st.slider(
-            "画像の表示サイズ",
-            min_value=300,
-            max_value=1200,
-            value=800,
-            step=100,
-            key="color_analysis_slider",
-        )
+    # defaultはタブのIDに含まれ、変わると選択がリセットされるため、
+    # 保存時に決めた値を使い続ける
+    tabs = st.tabs(
+        [label for _, label, _ in REPORT_TABS],
+        default=report["default_tab"],
+        key="report_tab",
+        on_change="rerun",
+    )
+    for tab, (analysis_type, _, display_tab) in zip(tabs, REPORT_TABS):
+        with tab:
+            # 選択中のタブだけを描画する
+            if not tab.open:
+                continue
+            # 未実行の分析だけを実行する（失敗した分析は再分析ボタンで実行する）
+            if analysis_type not in report["attempted"]:
+                run_lazy_analysis(report, analysis_type)
+            if analysis_type in report["errors"]:
+                st.warning(report["errors"][analysis_type])
+                if report["results"].get(analysis_type) is None and st.button(
+                    "🔄 再分析", key=f"{analysis_type}_retry"
+                ):
+                    run_lazy_analysis(report, analysis_type)
+                    st.rerun()
+            display_tab(
+                images, report["results"].get(analysis_type), report["pages"]
+            )
 
-        for idx, img_bytes in enumerate(image_bytes):
-            try:
-                image = Image.open(io.BytesIO(img_bytes))
-                st.image(image, caption="色彩分析の対象", width=display_width)
-
-                # 色彩情報の表示
-                with st.expander("色彩情報"):
-                    st.write(f"カラーモード: {image.mode}")
-                    if image.mode == "RGB":
-                        st.write("RGB画像として分析")
-                    elif image.mode == "CMYK":
-                        st.write("CMYK画像として分析")
-            except Exception as e:
-                st.error(f"画像の表示中にエラーが発生しました: {str(e)}")
-
-
-def display_overall_analysis_image(image_bytes):
-    """総合評価用の画像表示"""
-    if image_bytes and len(image_bytes) > 0:
-        st.divider()
-        st.subheader("📊 総合評価で分析した画像")
+    display_token_usage(report["usage"])
+    display_report_download(report)
 
-        for idx, img_bytes in enumerate(image_bytes):
-            try:
-                image = Image.open(io.BytesIO(img_bytes))
-                st.image(image, caption="総合評価の対象", use_column_width=True)
-            except Exception as e:
-                st.error(f"画像の表示中にエラーが発生しました: {str(e)}")
 
+# 形式を切り替えたときはダウンロード欄だけを再実行する
+@st.fragment
+def display_report_download(report):
+    """分析レポートのダウンロード"""
+    st.divider()
+    st.subheader("📑 分析レポートのダウンロード")
 
-def display_marketing_analysis_image(image_bytes):
-    """マーケティング分析用の画像表示"""
-    if image_bytes and len(image_bytes) > 0:
-        st.divider()
-        st.subheader("📈 マーケティング分析対象")
+    # 分析結果をJSON形式で保存（実行済みの分析のみ）
+    json_str = json.dumps(report["results"], ensure_ascii=False, indent=2)
+    st.download_button(
+        label="JSON形式でダウンロード",
+        data=json_str,
+        file_name="analysis_report.json",
+        mime="application/json",
+    )
 
-        cols = st.columns(len(image_bytes))
-        for idx, img_bytes in enumerate(image_bytes):
-            with cols[idx]:
-                try:
-                    image = Image.open(io.BytesIO(img_bytes))
-                    st.image(
-                        image, caption="マーケティング分析の対象", use_column_width=True
-                    )
-                except Exception as e:
-                    st.error(f"画像の表示中にエラーが発生しました: {str(e)}")
+    # ページ別の結果・エラー・トークン使用量を含むレポート、またはスコア表
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        export_format = st.selectbox(
+            "出力形式",
+            available_formats(),
+            format_func=EXPORT_FORMAT_LABELS.get,
+            key="export_format",
+        )
+    with col2:
+        compression = st.selectbox(
+            "圧縮",
+            [None, *available_compressions()],
+            format_func=lambda name: name or "なし",
+            key="export_compression",
+        )
+    with col3:
+        record = {
+            key: report[key]
+            for key in ("document", "results", "errors", "usage", "pages")
+        }
+
+        def export():
+            # ボタンが押されたときにだけ書き出す
+            buffer = io.BytesIO()
+            export_reports([record], buffer, export_format, compression)
+            return buffer.getvalue()
+
+        st.download_button(
+            label="ダウンロード",
+            data=export,
+            file_name=file_name("analysis_report", export_format, compression),
+            mime="application/octet-stream",
+        )
 
 
 def main():
@@ -680,11 +579,35 @@ def main():
             "業界", ["小売", "サービス", "製造", "テクノロジー", "金融", "その他"]
         )
 
+        # 最初に実行する分析（それ以外はタブを開いたときに実行）
+        eager_analyses = st.multiselect(
+            "事前に実行する分析",
+            list(ANALYSIS_LABELS),
+            default=["overall_impression"],
+            format_func=ANALYSIS_LABELS.get,
+            help="選択しなかった分析は、該当するタブを開いたときに実行されます",
+        )
+
         st.divider()
 
         # 分析の実行ボタン
         analyze_button = st.button("分析を実行", type="primary")
 
+        # トークン使用量（プロセス全体の本日分とこのセッション分）
+        with st.expander("トークン使用量"):
+            st.metric("本日の合計", f"{daily_ledger.today():,}")
+            session_id = get_session_id()
+            if session_id:
+                st.metric("このセッション", f"{daily_ledger.session(session_id):,}")
+
+        # モデル階層ごとの採用率とレイテンシ
+        with st.expander("モデル階層の統計"):
+            stats = tier_stats.snapshot()
+            if stats:
+                st.dataframe(pd.DataFrame(stats), hide_index=True)
+            else:
+                st.write("まだ分析が実行されていません")
+
         # ヘルプ情報
         with st.expander("ヘルプ"):
             st.markdown(
@@ -711,87 +634,65 @@ def main():
 
     if uploaded_file and analyze_button:
         with st.spinner("🔄 PDFを分析中..."):
-            text = extract_text_from_pdf(uploaded_file)
-            image_bytes = extract_image_bytes(uploaded_file)
+            page_texts, images = extract_pdf_content(uploaded_file)
+
+            # テキストのあるページをまとめ、ページ（グループ）ごとに並列で分析する
+            page_groups = group_pages(
+                text_page_inputs(page_texts, images),
+                get_config().page_group_size,
+            )
 
-            if text:
+            if page_groups:
                 # プログレスバーの表示
                 progress_bar = st.progress(0)
                 status_text = st.empty()
 
-                # 視覚分析
-                status_text.text("視覚要素を分析中...")
-                visual_analysis = analyze_with_gemini(text, "visual_analysis")
-                progress_bar.progress(25)
+                # レポート全体の期限（超過した分析はスキップして部分的なレポートを表示）
+                deadline = Deadline(get_config().report_timeout)
 
-                # 色彩分析
-                status_text.text("色彩を分析中...")
-                color_analysis = analyze_with_gemini(text, "color_analysis")
-                progress_bar.progress(50)
-
-                # 全体印象分析
-                status_text.text("全体的な印象を分析中...")
-                overall_impression = analyze_with_gemini(text, "overall_impression")
-                progress_bar.progress(75)
+                # トークン使用量の記録と予算による品質の引き下げ
+                config = get_config()
+                usage = ReportUsage(
+                    document_id=uploaded_file.name,
+                    session_id=get_session_id(),
+                    report_budget=config.report_token_budget,
+                    daily_budget=config.daily_token_budget,
+                )
 
-                # マーケティング分析
-                status_text.text("マーケティング戦略を分析中...")
-                marketing_analysis = analyze_marketing_strategy(text)
-                progress_bar.progress(100)
+                def show_progress(completed, total):
+                    progress_bar.progress(int(100 * completed / max(total, 1)))
+                    status_text.text(f"ページごとに分析中... ({completed}/{total})")
+
+                status_text.text(f"ページごとに分析中... (0/{len(page_groups)})")
+                report = run_pages(
+                    TEXT_PROMPTS,
+                    page_groups,
+                    analysis_types=tuple(eager_analyses),
+                    deadline=deadline,
+                    usage=usage,
+                    on_progress=show_progress,
+                )
 
                 # プログレス表示のクリア
                 status_text.empty()
                 progress_bar.empty()
 
-                tab1, tab2, tab3, tab4 = st.tabs(
-                    [
-                        "📊 総合評価",
-                        "👁️ 視覚分析",
-                        "🎨 色彩分析",
-                        "📈 マーケティング分析",
-                    ]
-                )
-
-                with tab1:
-                    st.header("総合評価")
-                    if overall_impression:
-                        display_analysis_images(image_bytes)  # 共通の画像表示
-                        display_overall_impression(overall_impression)
-
-                with tab2:
-                    st.header("視覚要素の分析")
-                    display_analysis_images(image_bytes)  # 共通の画像表示
-                    display_visual_analysis(visual_analysis)
-
-                with tab3:
-                    st.header("色彩分析")
-                    display_analysis_images(image_bytes)  # 共通の画像表示
-                    display_color_analysis(color_analysis)
-
-                with tab4:
-                    st.header("マーケティング分析")
-                    display_analysis_images(image_bytes)  # 共通の画像表示
-                    display_marketing_analysis(marketing_analysis)
-
-                # 分析レポートのダウンロード
-                st.divider()
-                st.subheader("📑 分析レポートのダウンロード")
-
-                # 分析結果をJSON形式で保存
-                analysis_results = {
-                    "visual_analysis": visual_analysis,
-                    "color_analysis": color_analysis,
-                    "overall_impression": overall_impression,
-                    "marketing_analysis": marketing_analysis,
+                # 分析結果はセッションに保存し、以降の再実行では再計算しない
+                st.session_state[REPORT_STATE_KEY] = {
+                    "file_id": uploaded_file.file_id,
+                    "document": uploaded_file.name,
+                    "images": images,
+                    "page_groups": page_groups,
+                    "usage_tracker": usage,
+                    # 実行済み（失敗を含む）の分析。再実行ではこれ以外の分析だけを実行する
+                    "attempted": set(eager_analyses),
+                    "default_tab": default_tab(report["results"]),
+                    **report,
                 }
 
-                json_str = json.dumps(analysis_results, ensure_ascii=False, indent=2)
-                st.download_button(
-                    label="JSON形式でダウンロード",
-                    data=json_str,
-                    file_name="analysis_report.json",
-                    mime="application/json",
-                )
+    report = st.session_state.get(REPORT_STATE_KEY)
+    if uploaded_file and report and report["file_id"] == uploaded_file.file_id:
+        display_report(report)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+"""PDFをまとめて分析するバッチ処理
+
+使い方: python -m src.backend.batch a.pdf b.pdf -o reports.json
+      python -m src.backend.batch *.pdf -o reports.jsonl.gz
+
+バッチ全体のトークン使用量は、JSON形式では出力ファイルの"usage"に含め、
+他の形式ではログにのみ出力する。
+"""
+
+import argparse
+import logging
+import os
+
+from src.backend.export import (
+    COMPRESSIONS,
+    EXPORT_FORMATS,
+    export_reports,
+    infer_format,
+)
+from src.backend.models.analysis import analyze_pages
+from src.backend.models.gemini_client import get_config
+from src.backend.models.hedging import Deadline
+from src.backend.models.image_features import image_features
+from src.backend.models.image_ranking import select_images
+from src.backend.models.pdf_handler import extract_images, group_by_page
+from src.backend.models.usage import ReportUsage, daily_ledger
+
+logger = logging.getLogger(__name__)
+
+BATCH_SESSION_ID = "batch"
+# ドキュメント単位のエラー（分析タイプのエラーと区別する）を記録するキー
+DOCUMENT_ERROR_KEY = "_document"
+
+
+def analyze_document(path: str) -> dict:
+    """1つのPDFを分析し、結果・エラー・トークン使用量を返す"""
+    config = get_config()
+    # ファイルから直接開き、PDF全体をメモリにコピーしない
+    images = extract_images(path)
+    # アイコン・罫線・繰り返しのロゴを除き、ページごとに代表画像だけを送る
+    selected = select_images(images, config.max_images_per_page, per_page=True)
+    page_images = group_by_page(selected)
+
+    if not any(page_images):
+        return {
+            "document": path,
+            "results": {},
+            "errors": {DOCUMENT_ERROR_KEY: "画像が見つかりませんでした"},
+        }
+
+    usage = ReportUsage(
+        document_id=os.path.basename(path),
+        session_id=BATCH_SESSION_ID,
+        report_budget=config.report_token_budget,
+        daily_budget=config.daily_token_budget,
+    )
+    report = analyze_pages(
+        page_images, deadline=Deadline(config.report_timeout), usage=usage
+    )
+    # 分析に使った代表画像の特徴量（比較・再分析用）
+    image_summaries = [
+        {
+            "page": image.page,
+            "number": image.number,
+            "text_fraction": round(image.text_fraction, 3),
+            **image_features(image.data).to_dict(),
+        }
+        for image in selected
+    ]
+    return {"document": path, **report, "images": image_summaries}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="広告PDFを一括で分析する")
+    parser.add_argument("pdfs", nargs="+", help="分析するPDFファイル")
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="reports.json",
+        help="出力先（拡張子で形式を判定: .json / .jsonl / .csv / .parquet、圧縮は .gz / .zst）",
+    )
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="出力形式")
+    parser.add_argument("--compression", choices=COMPRESSIONS, help="圧縮形式")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    export_format, compression = args.format, args.compression
+    if export_format is None:
+        export_format, inferred = infer_format(args.output)
+        compression = compression or inferred
+
+    # 分析したレポートから順に書き出し、全件をメモリに保持しない
+    total_tokens = 0
+
+    def reports():
+        nonlocal total_tokens
+        for path in args.pdfs:
+            try:
+                report = analyze_document(path)
+            except Exception as e:
+                # 壊れたPDFなどで中断すると書き出し中のファイル全体が不正になるため、
+                # エラーとして記録して次のドキュメントへ進む
+                logger.warning("%s の分析に失敗しました: %s", path, e)
+                report = {
+                    "document": path,
+                    "results": {},
+                    "errors": {DOCUMENT_ERROR_KEY: str(e)},
+                }
+            total_tokens += report.get("usage", {}).get("total_tokens", 0)
+            yield report
+
+    def summary():
+        return {
+            "usage": {
+                "total_tokens": total_tokens,
+                "today_tokens": daily_ledger.today(),
+            }
+        }
+
+    with open(args.output, "wb") as f:
+        count = export_reports(
+            reports(), f, export_format, compression, summary=summary
+        )
+    # バッチ全体のトークン使用量はJSON形式ではファイルにも含める（他の形式はログのみ）
+    usage = summary()["usage"]
+    logger.info(
+        "%d件のレポートを %s に書き出しました（トークン: 合計 %d、本日 %d）",
+        count,
+        args.output,
+        usage["total_tokens"],
+        usage["today_tokens"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""分析レポートのストリーミング出力（JSONL / JSON / CSV / Parquet）
+
+レポートはイテレータから1件ずつ書き出し、件数によらずメモリ使用量を一定に保つ。
+CSVとParquetには各レポートのスコアを1行に平坦化した表を出力する。
+"""
+
+import csv
+import gzip
+import importlib.util
+import io
+import json
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Iterable, Iterator
+
+from src.backend.models.schemas import RESPONSE_SCHEMAS
+
+EXPORT_FORMATS = ("jsonl", "json", "csv", "parquet")
+COMPRESSIONS = ("gzip", "zstd")
+
+# ファイル名の拡張子と出力形式・圧縮形式の対応
+_FORMAT_SUFFIXES = {
+    ".jsonl": "jsonl",
+    ".json": "json",
+    ".csv": "csv",
+    ".parquet": "parquet",
+}
+_COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+
+# Parquetの行グループ（書き出し単位）の行数
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def available_formats() -> list[str]:
+    """インストール済みのパッケージで利用できる出力形式"""
+    return [
+        name
+        for name in EXPORT_FORMATS
+        if name != "parquet" or importlib.util.find_spec("pyarrow")
+    ]
+
+
+def available_compressions() -> list[str]:
+    """インストール済みのパッケージで利用できる圧縮形式"""
+    return [
+        name
+        for name in COMPRESSIONS
+        if name != "zstd" or importlib.util.find_spec("zstandard")
+    ]
+
+
+def _score_paths(schema: dict, prefix: tuple[str, ...] = ()) -> Iterator[tuple]:
+    # 配列の中のスコア（色ごとの割合など）は件数が一定でないため含めない
+    if schema["type"] == "OBJECT":
+        for key, child in schema["properties"].items():
+            yield from _score_paths(child, (*prefix, key))
+    elif schema["type"] in ("INTEGER", "NUMBER"):
+        yield prefix
+
+
+# スコア表の列（分析タイプ.フィールドのパス）
+SCORE_COLUMNS = {
+    ".".join((analysis_type, *path)): (analysis_type, *path)
+    for analysis_type, schema in RESPONSE_SCHEMAS.items()
+    for path in _score_paths(schema)
+}
+TABLE_COLUMNS = ("document", "page", *SCORE_COLUMNS, "total_tokens", "errors")
+
+
+def infer_format(path: str) -> tuple[str, str | None]:
+    """ファイル名から出力形式と圧縮形式を判定する（例: reports.jsonl.gz）"""
+    compression = None
+    for suffix, name in _COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            compression = name
+            path = path[: -len(suffix)]
+            break
+    for suffix, name in _FORMAT_SUFFIXES.items():
+        if path.endswith(suffix):
+            return name, compression
+    raise ValueError(f"出力形式を判定できません: {path}")
+
+
+@contextmanager
+def _compressed(out: BinaryIO, compression: str | None):
+    """outへの書き込みを圧縮するストリーム（outは閉じない）"""
+    if compression is None:
+        yield out
+    elif compression == "gzip":
+        with gzip.GzipFile(fileobj=out, mode="wb") as stream:
+            yield stream
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ValueError(
+                "zstd圧縮にはzstandardパッケージが必要です（pip install zstandard）"
+            ) from e
+        with zstandard.ZstdCompressor().stream_writer(out, closefd=False) as stream:
+            yield stream
+    else:
+        raise ValueError(f"不正な圧縮形式です: {compression}")
+
+
+def _lookup(value, path: tuple[str, ...]):
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value if isinstance(value, (int, float)) else None
+
+
+def score_rows(report: dict) -> Iterator[dict]:
+    """レポートのスコアを平坦化した行（統合結果の行と、ページ別の行）"""
+    document = report.get("document", "")
+    usage = report.get("usage") or {}
+    sections = [("", report)]
+    if len(report.get("pages") or []) > 1:
+        sections += [(page["label"], page) for page in report["pages"]]
+    for label, section in sections:
+        results = section.get("results") or {}
+        row = {"document": document, "page": label}
+        for column, path in SCORE_COLUMNS.items():
+            row[column] = _lookup(results, path)
+        row["total_tokens"] = usage.get("total_tokens") if not label else None
+        row["errors"] = len(section.get("errors") or {})
+        yield row
+
+
+def write_jsonl(reports: Iterable[dict], out: BinaryIO) -> int:
+    """レポートを1行1件のJSONとして書き出し、件数を返す"""
+    count = 0
+    for report in reports:
+        out.write(json.dumps(report, ensure_ascii=False).encode("utf-8"))
+        out.write(b"\n")
+        count += 1
+    return count
+
+
+def write_json(
+    reports: Iterable[dict],
+    out: BinaryIO,
+    summary: Callable[[], dict] | None = None,
+) -> int:
+    """{"reports": [...]}形式のJSONを1件ずつ書き出す
+
+    summaryを指定した場合は、全件を書き出した後の戻り値を他のキーとして追加する。
+    """
+    count = 0
+    out.write(b'{\n  "reports": [')
+    for report in reports:
+        out.write(b",\n    " if count else b"\n    ")
+        out.write(json.dumps(report, ensure_ascii=False).encode("utf-8"))
+        count += 1
+    out.write(b"\n  ]")
+    for key, value in (summary() if summary else {}).items():
+        out.write(f",\n  {json.dumps(key)}: ".encode("utf-8"))
+        out.write(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+    out.write(b"\n}\n")
+    return count
+
+
+def write_csv(reports: Iterable[dict], out: BinaryIO) -> int:
+    """スコア表をCSVとして書き出し、レポートの件数を返す"""
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True)
+    writer = csv.DictWriter(text, fieldnames=TABLE_COLUMNS)
+    writer.writeheader()
+    count = 0
+    for report in reports:
+        writer.writerows(score_rows(report))
+        count += 1
+    # outを閉じないようにラッパーだけを切り離す
+    text.detach()
+    return count
+
+
+def write_parquet(
+    reports: Iterable[dict],
+    out: BinaryIO,
+    compression: str | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """スコア表をchunk_size行ずつParquetの行グループとして書き出し、レポートの件数を返す
+
+    圧縮はParquetの列圧縮（gzip / zstd）で行う。
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ValueError(
+            "Parquetの出力にはpyarrowが必要です（CSV形式も利用できます）"
+        ) from e
+
+    schema = pa.schema(
+        [
+            ("document", pa.string()),
+            ("page", pa.string()),
+            *((column, pa.float64()) for column in SCORE_COLUMNS),
+            ("total_tokens", pa.int64()),
+            ("errors", pa.int64()),
+        ]
+    )
+    count = 0
+    rows = []
+    with pq.ParquetWriter(out, schema, compression=compression or "none") as writer:
+        for report in reports:
+            rows.extend(score_rows(report))
+            count += 1
+            if len(rows) >= chunk_size:
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                rows = []
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+    return count
+
+
+def export_reports(
+    reports: Iterable[dict],
+    out: BinaryIO,
+    export_format: str = "jsonl",
+    compression: str | None = None,
+    summary: Callable[[], dict] | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """レポートを指定の形式・圧縮でoutに書き出し、件数を返す（outは閉じない）
+
+    summaryはJSON形式でのみ使用する。
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"不正な出力形式です: {export_format}")
+    if export_format == "parquet":
+        return write_parquet(reports, out, compression, chunk_size)
+    with _compressed(out, compression) as stream:
+        if export_format == "jsonl":
+            return write_jsonl(reports, stream)
+        if export_format == "json":
+            return write_json(reports, stream, summary)
+        return write_csv(reports, stream)
+
+
+def file_name(base: str, export_format: str, compression: str | None = None) -> str:
+    """出力形式・圧縮形式に対応するファイル名（例: analysis_report.csv.gz）"""
+    suffix = {"gzip": ".gz", "zstd": ".zst"}.get(compression, "")
+    if export_format == "parquet":
+        suffix = ""
+    return f"{base}.{export_format}{suffix}"
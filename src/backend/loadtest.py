@@ -0,0 +1,427 @@
+"""ダッシュボードの処理の流れを同時セッション数を増やしながら実行する負荷試験
+
+ローカルの疑似Geminiサーバー（実際に近いレイテンシで応答）に接続し、
+アップロード → 分析 → タブの閲覧 を模擬したセッションを並列に実行して、
+レイテンシのパーセンタイル・スループット・RSS・スレッド数を報告する。
+
+使い方: python -m src.backend.loadtest --sessions 1,4,16 [--pdf catalog.pdf] -o loadtest.json
+"""
+
+import argparse
+import dataclasses
+import gc
+import io
+import json
+import math
+import multiprocessing
+import random
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fitz
+from PIL import Image, ImageDraw
+
+from src.backend.models.analysis import text_page_inputs
+from src.backend.models.cascade import tier_stats
+from src.backend.models.gemini_client import ANALYSIS_TYPES, ClientConfig, configure
+from src.backend.models.hedging import Deadline
+from src.backend.models.image_ranking import select_images
+from src.backend.models.mapreduce import group_pages, run_pages
+from src.backend.models.pdf_handler import extract_pdf
+from src.backend.models.prompts import TEXT_PROMPTS
+from src.backend.models.usage import ReportUsage
+
+# ダッシュボードで最初に実行する分析（既定値）と表示する代表画像の数
+EAGER_ANALYSES = ("overall_impression",)
+DISPLAY_IMAGE_COUNT = 4
+
+# REST APIの応答スキーマの型（enum-encoding=intの場合は数値で送られる）
+_SCHEMA_TYPES = {
+    1: "STRING",
+    2: "NUMBER",
+    3: "INTEGER",
+    4: "BOOLEAN",
+    5: "ARRAY",
+    6: "OBJECT",
+}
+
+
+def sample_value(schema: dict, rng: random.Random):
+    """応答スキーマに沿ったダミーの値を作る"""
+    schema_type = _SCHEMA_TYPES.get(schema.get("type"), schema.get("type"))
+    if schema_type == "OBJECT":
+        return {
+            key: sample_value(child, rng)
+            for key, child in schema.get("properties", {}).items()
+        }
+    if schema_type == "ARRAY":
+        return [sample_value(schema.get("items", {}), rng) for _ in range(3)]
+    if schema_type == "INTEGER":
+        return rng.randint(40, 95)
+    if schema_type == "NUMBER":
+        return round(rng.uniform(5, 60), 1)
+    if schema_type == "BOOLEAN":
+        return rng.random() < 0.5
+    return f"サンプル{rng.randint(1, 9)}"
+
+
+class _FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        request = json.loads(body or b"{}")
+        server = self.server
+        with server.lock:
+            latency = server.rng.lognormvariate(
+                math.log(server.latency_median), server.latency_sigma
+            )
+            # 入力はおおむね4バイトで1トークンとして数える
+            prompt_tokens = len(body) // 4
+            if self.path.split("?")[0].endswith(":countTokens"):
+                payload = {"totalTokens": prompt_tokens}
+                latency = 0.0
+            else:
+                generation_config = request.get("generationConfig", {})
+                schema = generation_config.get("responseSchema", {"type": "OBJECT"})
+                text = json.dumps(sample_value(schema, server.rng), ensure_ascii=False)
+                payload = {
+                    "candidates": [
+                        {
+                            "content": {"parts": [{"text": text}], "role": "model"},
+                            "finishReason": "STOP",
+                        }
+                    ],
+                    "usageMetadata": {
+                        "promptTokenCount": prompt_tokens,
+                        "candidatesTokenCount": len(text),
+                        "totalTokenCount": prompt_tokens + len(text),
+                    },
+                }
+        time.sleep(latency)
+
+        data = json.dumps(payload).encode("utf-8")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # ヘッジで不要になったリクエストはクライアント側で切断される
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(connection, latency_median: float, latency_sigma: float, seed: int):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeGeminiHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.rng = random.Random(seed)
+    server.latency_median = latency_median
+    server.latency_sigma = latency_sigma
+    connection.send(server.server_port)
+    server.serve_forever()
+
+
+class FakeGeminiServer:
+    """generateContentに応答スキーマどおりのJSONを返す疑似Gemini REST API
+
+    計測対象のプロセスのRSSやスレッド数に影響しないよう、別プロセスで動かす。
+    レイテンシは中央値latency_median秒・ばらつきlatency_sigmaの対数正規分布に従う。
+    """
+
+    def __init__(
+        self, latency_median: float = 2.0, latency_sigma: float = 0.5, seed: int = 0
+    ):
+        self._args = (latency_median, latency_sigma, seed)
+        self._process: multiprocessing.Process | None = None
+        self.endpoint: str | None = None
+
+    def __enter__(self) -> "FakeGeminiServer":
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.Process(
+            target=_serve, args=(sender, *self._args), daemon=True
+        )
+        self._process.start()
+        self.endpoint = f"http://127.0.0.1:{receiver.recv()}"
+        return self
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join()
+
+
+def synthetic_catalog(pages: int = 4, seed: int = 0) -> bytes:
+    """テキスト・商品画像・ロゴを含む疑似カタログのPDFを作る"""
+    rng = random.Random(seed)
+
+    def png(image: Image.Image) -> bytes:
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    logo = Image.new("RGB", (180, 60), "white")
+    ImageDraw.Draw(logo).ellipse([5, 5, 55, 55], fill="red")
+    logo_data = png(logo)
+
+    doc = fitz.open()
+    for number in range(1, pages + 1):
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(20, 20, 110, 50), stream=logo_data)
+        photo = Image.new("RGB", (800, 600), (250, 240, 220))
+        draw = ImageDraw.Draw(photo)
+        for _ in range(30):
+            x, y = rng.randrange(800), rng.randrange(600)
+            size = rng.randrange(20, 200)
+            color = tuple(rng.randrange(256) for _ in range(3))
+            draw.ellipse([x, y, x + size, y + size], fill=color)
+        page.insert_image(fitz.Rect(50, 100, 550, 475), stream=png(photo))
+        page.insert_text(
+            (50, 520), f"Spring Sale - page {number}: 30% off selected items"
+        )
+    data = doc.tobytes(deflate=True)
+    doc.close()
+    return data
+
+
+def rss_bytes() -> int:
+    """現在のRSS（/procが使えない場合はこれまでの最大値）"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ResourceMonitor:
+    """RSSとスレッド数を一定間隔で記録し、最大値を保持する"""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while True:
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self) -> "ResourceMonitor":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+@dataclasses.dataclass
+class SessionResult:
+    """1セッション分の計測結果"""
+
+    analyze_seconds: float
+    tab_seconds: list[float]
+    total_seconds: float
+    errors: int
+
+
+def run_session(
+    pdf_bytes: bytes,
+    session_id: str,
+    eager_analyses: tuple[str, ...] = EAGER_ANALYSES,
+) -> tuple[SessionResult, dict]:
+    """ダッシュボードと同じ流れで1セッションを実行する
+
+    PDFの読み込み・代表画像の選定・事前分析の後、残りのタブを順に開いて遅延分析を実行する。
+    セッションが保持する状態（st.session_stateに相当）も返す。
+    """
+    started = time.monotonic()
+    content = extract_pdf(io.BytesIO(pdf_bytes))
+    images = select_images(content.images, DISPLAY_IMAGE_COUNT)
+    page_groups = group_pages(text_page_inputs(content.page_texts, images))
+    config = configure()
+    usage = ReportUsage(
+        document_id="loadtest.pdf",
+        session_id=session_id,
+        report_budget=config.report_token_budget,
+        daily_budget=config.daily_token_budget,
+    )
+    report = run_pages(
+        TEXT_PROMPTS,
+        page_groups,
+        analysis_types=eager_analyses,
+        deadline=Deadline(config.report_timeout),
+        usage=usage,
+    )
+    analyze_seconds = time.monotonic() - started
+
+    tab_seconds = []
+    for analysis_type in ANALYSIS_TYPES:
+        if analysis_type in report["results"]:
+            continue
+        tab_started = time.monotonic()
+        result = run_pages(
+            TEXT_PROMPTS,
+            page_groups,
+            analysis_types=(analysis_type,),
+            deadline=Deadline(config.report_timeout),
+            usage=usage,
+        )
+        report["results"].update(result["results"])
+        report["errors"].update(result["errors"])
+        tab_seconds.append(time.monotonic() - tab_started)
+
+    state = {"pdf": pdf_bytes, "images": images, "usage_tracker": usage, **report}
+    return (
+        SessionResult(
+            analyze_seconds=analyze_seconds,
+            tab_seconds=tab_seconds,
+            total_seconds=time.monotonic() - started,
+            errors=len(report["errors"]),
+        ),
+        state,
+    )
+
+
+def percentiles(values: list[float]) -> dict | None:
+    """p50・p95・p99・最大値（最近傍順位法）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return round(ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)], 3)
+
+    return {
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def run_level(pdf_bytes: bytes, sessions: int) -> dict:
+    """sessions個のセッションを同時に実行し、レイテンシとリソース使用量を集計する"""
+    gc.collect()
+    rss_before = rss_bytes()
+    threads_before = threading.active_count()
+
+    with ResourceMonitor() as monitor, ThreadPoolExecutor(sessions) as executor:
+        started = time.monotonic()
+        futures = [
+            executor.submit(run_session, pdf_bytes, f"loadtest-{sessions}-{index}")
+            for index in range(sessions)
+        ]
+        outcomes = [future.result() for future in futures]
+        elapsed = time.monotonic() - started
+
+    # 全セッションの状態を保持したままRSSを測る
+    rss_after = rss_bytes()
+    results = [result for result, _ in outcomes]
+    del outcomes
+
+    mb = 1024 * 1024
+    return {
+        "sessions": sessions,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_sessions_per_second": round(sessions / elapsed, 3),
+        "analyze_seconds": percentiles([r.analyze_seconds for r in results]),
+        "tab_seconds": percentiles([s for r in results for s in r.tab_seconds]),
+        "session_seconds": percentiles([r.total_seconds for r in results]),
+        "errors": sum(r.errors for r in results),
+        "rss_mb": {
+            "before": round(rss_before / mb, 1),
+            "peak": round(max(monitor.peak_rss, rss_after) / mb, 1),
+            "after": round(rss_after / mb, 1),
+            "growth": round((rss_after - rss_before) / mb, 1),
+        },
+        "threads": {"before": threads_before, "peak": monitor.peak_threads},
+    }
+
+
+def _print_level(level: dict) -> None:
+    analyze = level["analyze_seconds"]
+    tabs = level["tab_seconds"] or {"p95": 0.0}
+    print(
+        f"{level['sessions']:>8} {level['throughput_sessions_per_second']:>10.2f}"
+        f" {analyze['p50']:>8.2f} {analyze['p95']:>8.2f} {tabs['p95']:>8.2f}"
+        f" {level['rss_mb']['growth']:>9.1f} {level['threads']['peak']:>8}"
+        f" {level['errors']:>6}"
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="同時セッション数を増やして負荷試験を行う"
+    )
+    parser.add_argument(
+        "--sessions", default="1,2,4,8", help="同時セッション数（カンマ区切り）"
+    )
+    parser.add_argument("--pdf", help="使用するPDF（省略時は疑似カタログを生成）")
+    parser.add_argument("--pages", type=int, default=4, help="疑似カタログのページ数")
+    parser.add_argument(
+        "--latency-median",
+        type=float,
+        default=2.0,
+        help="疑似モデルのレイテンシ中央値（秒）",
+    )
+    parser.add_argument(
+        "--latency-sigma",
+        type=float,
+        default=0.5,
+        help="疑似モデルのレイテンシのばらつき",
+    )
+    parser.add_argument("-o", "--output", help="結果をJSONで出力する先")
+    args = parser.parse_args(argv)
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            pdf_bytes = f.read()
+    else:
+        pdf_bytes = synthetic_catalog(args.pages)
+
+    levels = []
+    with FakeGeminiServer(args.latency_median, args.latency_sigma) as server:
+        configure(
+            dataclasses.replace(
+                ClientConfig.from_env(),
+                api_key="loadtest",
+                api_endpoint=server.endpoint,
+                transport="rest",
+                cassette_mode=None,
+                warm_up=False,
+            )
+        )
+        print(
+            "sessions throughput  ana_p50  ana_p95  tab_p95  rss_grow  threads errors"
+        )
+        for sessions in (int(value) for value in args.sessions.split(",")):
+            level = run_level(pdf_bytes, sessions)
+            _print_level(level)
+            levels.append(level)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {"levels": levels, "tiers": tier_stats.snapshot()},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
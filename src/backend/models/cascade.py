@@ -0,0 +1,219 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from src.backend.models.gemini_client import generation_config_for, get_config
+from src.backend.models.hedging import Deadline, DeadlineExceeded, generate_with_hedge
+from src.backend.models.json_repair import parse_json
+from src.backend.models.schemas import (
+    QualityHeuristics,
+    combined_schema,
+    incomplete_fields,
+    subset_schema,
+    validate_analysis,
+)
+from src.backend.models.usage import ReportUsage
+
+logger = logging.getLogger(__name__)
+
+
+class TierStats:
+    """カスケードの階層（分析タイプ・モデル）ごとの採用率とレイテンシを記録する"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[tuple[str, str], dict] = defaultdict(
+            lambda: {"attempts": 0, "accepted": 0, "escalated": 0, "seconds": 0.0}
+        )
+
+    def record(
+        self, analysis_type: str, model_name: str, accepted: bool, seconds: float
+    ) -> None:
+        with self._lock:
+            stats = self._stats[(analysis_type, model_name)]
+            stats["attempts"] += 1
+            stats["accepted" if accepted else "escalated"] += 1
+            stats["seconds"] += seconds
+
+    def snapshot(self) -> list[dict]:
+        """階層ごとの集計（採用率・平均レイテンシ）を返す"""
+        with self._lock:
+            items = [(key, dict(stats)) for key, stats in self._stats.items()]
+        return [
+            {
+                "analysis_type": analysis_type,
+                "model": model_name,
+                "attempts": stats["attempts"],
+                "accepted": stats["accepted"],
+                "escalated": stats["escalated"],
+                "hit_rate": stats["accepted"] / stats["attempts"],
+                "avg_seconds": stats["seconds"] / stats["attempts"],
+            }
+            for (analysis_type, model_name), stats in sorted(items)
+        ]
+
+
+tier_stats = TierStats()
+
+
+def run_cascade(
+    analysis_type: str,
+    contents,
+    deadline: Deadline | None = None,
+    usage: ReportUsage | None = None,
+    heuristics: QualityHeuristics | None = None,
+) -> dict:
+    """高速なモデルから順に分析を実行し、品質が不足した場合のみ上位のモデルへ進む
+
+    最後の階層の結果は検証に失敗しても返す（従来の単一モデルと同じ動作）。
+    heuristicsを省略した場合は設定の品質判定を使う。
+    """
+    config = get_config()
+    heuristics = heuristics or config.heuristics
+    tiers = config.tiers_for(analysis_type)
+    for tier, model_name in enumerate(tiers, 1):
+        is_last = tier == len(tiers)
+        started = time.monotonic()
+        try:
+            response = generate_with_hedge(
+                analysis_type,
+                contents,
+                model_name=model_name,
+                deadline=deadline,
+                validate=lambda response: parse_json(response.text),
+                usage=usage,
+            )
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            tier_stats.record(
+                analysis_type, model_name, False, time.monotonic() - started
+            )
+            if is_last:
+                raise
+            logger.info(
+                "%s: %s の応答が不正なため上位モデルへ: %s",
+                analysis_type,
+                model_name,
+                e,
+            )
+            continue
+
+        result = parse_json(response.text)
+        problems = validate_analysis(analysis_type, result, heuristics)
+        if is_last and problems:
+            result = _complete_missing_fields(
+                analysis_type, contents, result, model_name, deadline, usage, heuristics
+            )
+            problems = validate_analysis(analysis_type, result, heuristics)
+        tier_stats.record(
+            analysis_type,
+            model_name,
+            is_last or not problems,
+            time.monotonic() - started,
+        )
+        if is_last or not problems:
+            return result
+        logger.info(
+            "%s: %s の応答が品質基準を満たさないため上位モデルへ: %s",
+            analysis_type,
+            model_name,
+            problems[:3],
+        )
+
+
+def _complete_missing_fields(
+    analysis_type: str,
+    contents,
+    result,
+    model_name: str,
+    deadline: Deadline | None,
+    usage: ReportUsage | None,
+    heuristics: QualityHeuristics,
+):
+    """修復しても欠けているフィールドだけを再リクエストして補完する"""
+    fields = incomplete_fields(analysis_type, result, heuristics)
+    if not isinstance(result, dict) or not fields:
+        return result
+
+    instruction = (
+        "出力は次のフィールドのみを含むJSONオブジェクトにしてください: "
+        + ", ".join(fields)
+    )
+    parts = list(contents) if isinstance(contents, (list, tuple)) else [contents]
+    try:
+        response = generate_with_hedge(
+            analysis_type,
+            [*parts, instruction],
+            model_name=model_name,
+            deadline=deadline,
+            validate=lambda response: parse_json(response.text),
+            usage=usage,
+            generation_config=generation_config_for(
+                response_schema=subset_schema(analysis_type, fields)
+            ),
+        )
+        subtree = parse_json(response.text)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logger.info("%s: 欠落フィールドの補完に失敗しました: %s", analysis_type, e)
+        return result
+
+    if isinstance(subtree, dict):
+        result = {**result, **{k: v for k, v in subtree.items() if k in fields}}
+    return result
+
+
+def run_combined(
+    prompts: dict[str, str],
+    inputs: list,
+    deadline: Deadline | None = None,
+    usage: ReportUsage | None = None,
+    heuristics: QualityHeuristics | None = None,
+) -> tuple[dict, dict]:
+    """複数の分析を1回のリクエストにまとめて実行する（トークン予算が逼迫した場合）
+
+    分析タイプ名をキーとする1つのJSONを要求し、カスケードの最初（最も安価）のモデルで
+    実行する。戻り値は（タイプごとの結果, エラー）。欠落・不正なフィールドがある結果は
+    Noneとし、エラーに記録する（表示時に個別に再分析される）。
+    """
+    config = get_config()
+    heuristics = heuristics or config.heuristics
+    instruction = (
+        "以下の各分析を行い、分析タイプ名（"
+        + ", ".join(prompts)
+        + "）をキーとして結果をまとめた1つのJSONオブジェクトで返してください。"
+    )
+    sections = [
+        f"[{analysis_type}]\n{prompt}" for analysis_type, prompt in prompts.items()
+    ]
+    response = generate_with_hedge(
+        "combined",
+        [instruction, *sections, *inputs],
+        model_name=config.tiers_for(None)[0],
+        deadline=deadline,
+        validate=lambda response: parse_json(response.text),
+        usage=usage,
+        generation_config=generation_config_for(
+            response_schema=combined_schema(list(prompts))
+        ),
+    )
+    result = parse_json(response.text)
+    if not isinstance(result, dict):
+        result = {}
+
+    results = {}
+    errors = {}
+    for analysis_type in prompts:
+        section = result.get(analysis_type)
+        fields = incomplete_fields(analysis_type, section, heuristics)
+        if fields:
+            results[analysis_type] = None
+            errors[analysis_type] = (
+                f"統合した分析の結果が不完全です（{', '.join(fields)}）"
+            )
+        else:
+            results[analysis_type] = section
+    return results, errors
@@ -0,0 +1,155 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from google.generativeai import protos
+from google.generativeai.types.generation_types import GenerateContentResponse
+
+from src.backend.models.prompts import PROMPT_VERSION
+
+
+class CassetteMiss(KeyError):
+    """再生モードで記録済みの応答が見つからない"""
+
+
+def _digest(data) -> str:
+    # hashlibはバッファをそのまま読むため、memoryviewもコピーせずにハッシュできる
+    return hashlib.sha256(data).hexdigest()
+
+
+def _normalize(contents):
+    """リクエスト内容を指紋用の表現に変換する（バイナリはハッシュに置き換える）"""
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, (bytes, bytearray, memoryview)):
+        return {"sha256": _digest(contents)}
+    if isinstance(contents, dict):
+        return {
+            key: (
+                {"sha256": _digest(value)}
+                if isinstance(value, (bytes, bytearray, memoryview))
+                else _normalize(value)
+            )
+            for key, value in sorted(contents.items())
+        }
+    if isinstance(contents, (list, tuple)):
+        return [_normalize(item) for item in contents]
+    if hasattr(contents, "save"):
+        # PIL画像
+        buffer = io.BytesIO()
+        contents.save(buffer, format="PNG")
+        return {"sha256": _digest(buffer.getbuffer())}
+    return repr(contents)
+
+
+def fingerprint(model_name: str, generation_config, contents) -> str:
+    """モデル名・生成設定・プロンプト・入力データのハッシュからリクエストの指紋を作る"""
+    payload = json.dumps(
+        {
+            "prompt_version": PROMPT_VERSION,
+            "model": model_name,
+            "generation_config": _normalize(generation_config or {}),
+            "contents": _normalize(contents),
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        default=repr,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CassetteStore:
+    """記録した応答とレイテンシを保持するSQLiteファイル（応答はzlib圧縮）"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                fingerprint TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response BLOB NOT NULL,
+                latency REAL NOT NULL,
+                recorded_at REAL NOT NULL
+            )
+            """)
+        self._conn.commit()
+
+    def get(self, key: str) -> tuple[dict, float] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, latency FROM responses WHERE fingerprint = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0])), row[1]
+
+    def put(self, key: str, model_name: str, response: dict, latency: float) -> None:
+        blob = zlib.compress(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, blob, latency, time.time()),
+            )
+            self._conn.commit()
+
+
+class CassetteModel:
+    """GenerativeModelのgenerate_contentを記録・再生するラッパー
+
+    record: 実際に呼び出し、応答と観測レイテンシを保存する
+    replay: ネットワークを使わず保存済みの応答を返す（speed倍速で待機、0なら待機なし）
+    """
+
+    def __init__(
+        self,
+        model,
+        store: CassetteStore,
+        mode: str,
+        speed: float = 1.0,
+        generation_config: dict | None = None,
+    ):
+        self._model = model
+        self._generation_config = generation_config or {}
+        self._store = store
+        self._mode = mode
+        self._speed = speed
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def generate_content(self, contents, **kwargs):
+        key = fingerprint(
+            self._model.model_name,
+            {
+                **self._generation_config,
+                **dict(kwargs.get("generation_config") or {}),
+            },
+            contents,
+        )
+        if self._mode == "replay":
+            recorded = self._store.get(key)
+            if recorded is None:
+                raise CassetteMiss(f"記録済みの応答がありません: {key[:12]}")
+            response, latency = recorded
+            if self._speed > 0:
+                time.sleep(latency / self._speed)
+            return GenerateContentResponse.from_response(
+                protos.GenerateContentResponse(response)
+            )
+
+        started = time.monotonic()
+        response = self._model.generate_content(contents, **kwargs)
+        latency = time.monotonic() - started
+        if self._mode == "record":
+            self._store.put(key, self._model.model_name, response.to_dict(), latency)
+        return response
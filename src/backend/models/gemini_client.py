@@ -0,0 +1,386 @@
+import copy
+import logging
+import os
+import socket
+import threading
+from dataclasses import dataclass, field
+from typing import Literal
+
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+from src.backend.models.cassette import CassetteModel, CassetteStore
+from src.backend.models.schemas import (
+    DEFAULT_HEURISTICS,
+    RESPONSE_SCHEMAS,
+    QualityHeuristics,
+)
+
+logger = logging.getLogger(__name__)
+
+AnalysisType = Literal[
+    "visual_analysis",
+    "color_analysis",
+    "overall_impression",
+    "marketing_analysis",
+]
+
+ANALYSIS_TYPES: tuple[str, ...] = (
+    "visual_analysis",
+    "color_analysis",
+    "overall_impression",
+    "marketing_analysis",
+)
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+DEFAULT_FAST_MODEL = "gemini-1.5-flash-8b"
+DEFAULT_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_REPORT_TIMEOUT = 180.0
+DEFAULT_HEDGE_BUDGET = 0.1
+DEFAULT_CASSETTE_PATH = "cassettes/gemini.sqlite3"
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_IMAGES_PER_PAGE = 2
+DEFAULT_CALL_CONCURRENCY = 32
+DEFAULT_POOL_SIZE = 32
+DEFAULT_KEEP_ALIVE = 30.0
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in ("1", "true", "yes", "on")
+
+
+def _split_models(value: str) -> tuple[str, ...]:
+    # カンマ区切りのモデル名（空文字列の場合はカスケードなし）
+    return tuple(name.strip() for name in value.split(",") if name.strip())
+
+
+@dataclass(frozen=True)
+class ClientConfig:
+    """Geminiクライアントの設定（モデル・生成設定・タイムアウト・接続先）"""
+
+    api_key: str | None = None
+    # ローカルの代替エンドポイント（例: http://127.0.0.1:8765）
+    api_endpoint: str | None = None
+    # "grpc" または "rest"（Noneの場合はライブラリの既定値）
+    transport: str | None = None
+    default_model: str = DEFAULT_MODEL
+    # 分析タイプごとのモデル名（未指定のタイプはdefault_modelを使用）
+    models: dict[str, str] = field(default_factory=dict)
+    # 本来のモデルより先に試す高速・低コストなモデル（品質が不足した場合のみ上位へ）
+    cascade: tuple[str, ...] = (DEFAULT_FAST_MODEL,)
+    # 分析タイプごとのカスケード（未指定のタイプはcascadeを使用）
+    cascades: dict[str, tuple[str, ...]] = field(default_factory=dict)
+    # カスケードで上位モデルへ進むかを決める品質判定
+    heuristics: QualityHeuristics = DEFAULT_HEURISTICS
+    generation_config: dict = field(
+        default_factory=lambda: dict(DEFAULT_GENERATION_CONFIG)
+    )
+    timeout: float | None = DEFAULT_TIMEOUT
+    # レポート全体（全分析の合計）の期限
+    report_timeout: float | None = DEFAULT_REPORT_TIMEOUT
+    # ヘッジリクエストとして追加送信してよいリクエストの割合（0で無効）
+    hedge_budget: float = DEFAULT_HEDGE_BUDGET
+    # 1レポートあたり・1日あたりのトークン予算（Noneで無制限）
+    report_token_budget: int | None = None
+    daily_token_budget: int | None = None
+    # 複数ページのPDFでページ（グループ）ごとの分析を同時に実行する数
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    # 1回の分析にまとめるページ数
+    page_group_size: int = 1
+    # 1ページあたりに分析へ送る代表画像の最大数
+    max_images_per_page: int = DEFAULT_MAX_IMAGES_PER_PAGE
+    # プロセス全体で同時に実行するモデル呼び出し（ヘッジを含む）の最大数
+    call_concurrency: int = DEFAULT_CALL_CONCURRENCY
+    # RESTセッションの接続プールの大きさ（call_concurrency未満の場合はcall_concurrency）
+    pool_size: int = DEFAULT_POOL_SIZE
+    # アイドル状態の接続を維持するTCPキープアライブの間隔（秒、0で無効）
+    keep_alive: float = DEFAULT_KEEP_ALIVE
+    warm_up: bool = False
+    # 応答の記録・再生（"record" / "replay"、Noneの場合は無効）
+    cassette_mode: str | None = None
+    cassette_path: str = DEFAULT_CASSETTE_PATH
+    # 再生速度の倍率（1.0で記録時と同じレイテンシ、0で待機なし）
+    cassette_speed: float = 1.0
+
+    @classmethod
+    def from_env(cls) -> "ClientConfig":
+        """環境変数から設定を読み込む"""
+        api_endpoint = os.getenv("GEMINI_API_ENDPOINT") or None
+        transport = os.getenv("GEMINI_TRANSPORT") or None
+        if api_endpoint and api_endpoint.startswith("http://") and not transport:
+            # 平文HTTPの代替エンドポイントはRESTでのみ接続できる
+            transport = "rest"
+
+        models = {}
+        cascades = {}
+        for analysis_type in ANALYSIS_TYPES:
+            model_name = os.getenv(f"GEMINI_MODEL_{analysis_type.upper()}")
+            if model_name:
+                models[analysis_type] = model_name
+            cascade = os.getenv(f"GEMINI_CASCADE_{analysis_type.upper()}")
+            if cascade is not None:
+                cascades[analysis_type] = _split_models(cascade)
+
+        cascade = os.getenv("GEMINI_CASCADE")
+        min_list_items = os.getenv("GEMINI_MIN_LIST_ITEMS")
+        min_text_length = os.getenv("GEMINI_MIN_TEXT_LENGTH")
+        reject_uniform_scores = os.getenv("GEMINI_REJECT_UNIFORM_SCORES")
+        heuristics = QualityHeuristics(
+            min_list_items=(
+                int(min_list_items)
+                if min_list_items
+                else DEFAULT_HEURISTICS.min_list_items
+            ),
+            min_text_length=(
+                int(min_text_length)
+                if min_text_length
+                else DEFAULT_HEURISTICS.min_text_length
+            ),
+            reject_uniform_scores=(
+                _env_flag("GEMINI_REJECT_UNIFORM_SCORES")
+                if reject_uniform_scores
+                else DEFAULT_HEURISTICS.reject_uniform_scores
+            ),
+        )
+
+        timeout = os.getenv("GEMINI_TIMEOUT")
+        report_timeout = os.getenv("GEMINI_REPORT_TIMEOUT")
+        hedge_budget = os.getenv("GEMINI_HEDGE_BUDGET")
+        cassette_speed = os.getenv("GEMINI_CASSETTE_SPEED")
+        report_token_budget = os.getenv("GEMINI_REPORT_TOKEN_BUDGET")
+        daily_token_budget = os.getenv("GEMINI_DAILY_TOKEN_BUDGET")
+        max_concurrency = os.getenv("GEMINI_MAX_CONCURRENCY")
+        page_group_size = os.getenv("GEMINI_PAGE_GROUP_SIZE")
+        max_images_per_page = os.getenv("GEMINI_MAX_IMAGES_PER_PAGE")
+        call_concurrency = os.getenv("GEMINI_CALL_CONCURRENCY")
+        pool_size = os.getenv("GEMINI_POOL_SIZE")
+        keep_alive = os.getenv("GEMINI_KEEP_ALIVE")
+        return cls(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            api_endpoint=api_endpoint,
+            transport=transport,
+            default_model=os.getenv("GEMINI_MODEL", DEFAULT_MODEL),
+            models=models,
+            cascade=(
+                _split_models(cascade) if cascade is not None else (DEFAULT_FAST_MODEL,)
+            ),
+            cascades=cascades,
+            heuristics=heuristics,
+            timeout=float(timeout) if timeout else DEFAULT_TIMEOUT,
+            report_timeout=(
+                float(report_timeout) if report_timeout else DEFAULT_REPORT_TIMEOUT
+            ),
+            hedge_budget=(
+                float(hedge_budget) if hedge_budget else DEFAULT_HEDGE_BUDGET
+            ),
+            report_token_budget=(
+                int(report_token_budget) if report_token_budget else None
+            ),
+            daily_token_budget=int(daily_token_budget) if daily_token_budget else None,
+            max_concurrency=(
+                int(max_concurrency) if max_concurrency else DEFAULT_MAX_CONCURRENCY
+            ),
+            page_group_size=int(page_group_size) if page_group_size else 1,
+            max_images_per_page=(
+                int(max_images_per_page)
+                if max_images_per_page
+                else DEFAULT_MAX_IMAGES_PER_PAGE
+            ),
+            call_concurrency=(
+                int(call_concurrency) if call_concurrency else DEFAULT_CALL_CONCURRENCY
+            ),
+            pool_size=int(pool_size) if pool_size else DEFAULT_POOL_SIZE,
+            keep_alive=float(keep_alive) if keep_alive else DEFAULT_KEEP_ALIVE,
+            warm_up=_env_flag("GEMINI_WARMUP"),
+            cassette_mode=os.getenv("GEMINI_CASSETTE_MODE") or None,
+            cassette_path=os.getenv("GEMINI_CASSETTE_PATH", DEFAULT_CASSETTE_PATH),
+            cassette_speed=float(cassette_speed) if cassette_speed else 1.0,
+        )
+
+    def model_for(self, analysis_type: str | None = None) -> str:
+        """分析タイプに対応するモデル名を返す"""
+        return self.models.get(analysis_type, self.default_model)
+
+    def tiers_for(self, analysis_type: str | None = None) -> tuple[str, ...]:
+        """分析タイプのカスケード（高速なモデルから順に、最後が本来のモデル）"""
+        cascade = self.cascades.get(analysis_type, self.cascade)
+        tiers = (*cascade, self.model_for(analysis_type))
+        return tuple(dict.fromkeys(tiers))
+
+
+class _PooledAdapter(HTTPAdapter):
+    """接続プールの大きさとTCPキープアライブを指定したアダプタ"""
+
+    def __init__(self, pool_size: int, keep_alive: float):
+        socket_options = list(HTTPConnection.default_socket_options)
+        if keep_alive:
+            socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            for name in ("TCP_KEEPIDLE", "TCP_KEEPINTVL"):
+                if hasattr(socket, name):
+                    socket_options.append(
+                        (socket.IPPROTO_TCP, getattr(socket, name), int(keep_alive))
+                    )
+        # HTTPAdapter.__init__がinit_poolmanagerを呼ぶため先に設定する
+        self._socket_options = socket_options
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = self._socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+def _configure_transport(config: "ClientConfig") -> None:
+    """共有RESTセッションの接続プールを設定する
+
+    genaiの既定のRESTセッションはプールが10接続までのため、同時呼び出しが多いと
+    接続待ちになる。gRPCは1つのチャネルで多重化するため設定しない。
+    """
+    if config.transport != "rest" or config.cassette_mode == "replay":
+        return
+    try:
+        client = genai_client._client_manager.get_default_client("generative")
+    except Exception as e:
+        # 認証情報がない場合などは最初の呼び出し時に改めてエラーになる
+        logger.warning("Geminiの接続プールを設定できませんでした: %s", e)
+        return
+    session = getattr(client._transport, "_session", None)
+    if session is None:
+        return
+    # 同時呼び出しの全てが接続を確保できる大きさにする
+    pool_size = max(config.pool_size, config.call_concurrency)
+    adapter = _PooledAdapter(pool_size, config.keep_alive)
+    for prefix in ("https://", "http://"):
+        session.mount(prefix, adapter)
+
+
+_lock = threading.Lock()
+_config: ClientConfig | None = None
+_models: dict[tuple[str, str | None], genai.GenerativeModel] = {}
+_cassette_store: CassetteStore | None = None
+_warm_up_thread: threading.Thread | None = None
+
+
+def configure(config: ClientConfig | None = None) -> ClientConfig:
+    """クライアントを設定する
+
+    genaiのクライアント（gRPCチャネル / RESTセッション）はプロセス内で共有されるため、
+    設定はプロセスごとに一度だけ行い、全ての呼び出し元で同じ接続を再利用する。
+    明示的にconfigを渡した場合は設定をやり直す。
+    """
+    global _config, _cassette_store
+    with _lock:
+        if _config is not None and config is None:
+            return _config
+
+        config = config or ClientConfig.from_env()
+        if config.cassette_mode not in (None, "record", "replay"):
+            raise ValueError(f"不正なカセットモードです: {config.cassette_mode}")
+        client_options = {}
+        if config.api_endpoint:
+            client_options["api_endpoint"] = config.api_endpoint
+        genai.configure(
+            api_key=config.api_key,
+            transport=config.transport,
+            client_options=client_options or None,
+        )
+        _configure_transport(config)
+        _config = config
+        _models.clear()
+        _cassette_store = (
+            CassetteStore(config.cassette_path) if config.cassette_mode else None
+        )
+
+    # 再生モードではネットワークに接続しない
+    if config.warm_up and config.cassette_mode != "replay":
+        warm_up()
+    return config
+
+
+def get_config() -> ClientConfig:
+    """現在の設定を返す（未設定の場合は環境変数から設定する）"""
+    return _config or configure()
+
+
+def generation_config_for(
+    analysis_type: str | None = None, response_schema: dict | None = None
+) -> dict:
+    """生成設定を返す（分析タイプの応答スキーマをresponse_schemaとして指定する）"""
+    generation_config = dict(get_config().generation_config)
+    if response_schema is None and analysis_type in RESPONSE_SCHEMAS:
+        response_schema = RESPONSE_SCHEMAS[analysis_type]
+    if response_schema is not None:
+        generation_config["response_schema"] = copy.deepcopy(response_schema)
+    return generation_config
+
+
+def get_model(
+    analysis_type: str | None = None, model_name: str | None = None
+) -> genai.GenerativeModel:
+    """分析タイプに対応するモデルを返す（モデル名・分析タイプごとに再利用）"""
+    config = get_config()
+    model_name = model_name or config.model_for(analysis_type)
+    key = (model_name, analysis_type)
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            generation_config = generation_config_for(analysis_type)
+            model = genai.GenerativeModel(
+                model_name=model_name,
+                generation_config=generation_config,
+            )
+            if _cassette_store is not None:
+                model = CassetteModel(
+                    model,
+                    _cassette_store,
+                    config.cassette_mode,
+                    speed=config.cassette_speed,
+                    generation_config=generation_config,
+                )
+            _models[key] = model
+    return model
+
+
+def request_options(timeout: float | None = None) -> dict:
+    """generate_contentに渡すリクエストオプション"""
+    timeout = timeout if timeout is not None else get_config().timeout
+    return {"timeout": timeout} if timeout else {}
+
+
+def _warm_up(model_names: list[str]) -> None:
+    for model_name in model_names:
+        try:
+            # 共有クライアントの接続（TLSハンドシェイクなど）を事前に確立する
+            get_model(model_name=model_name).count_tokens(
+                "ping", request_options=request_options()
+            )
+        except Exception as e:
+            logger.warning(
+                "Geminiのウォームアップに失敗しました (%s): %s", model_name, e
+            )
+
+
+def warm_up(background: bool = True) -> threading.Thread | None:
+    """使用する全モデルに対して接続を事前に確立する（プロセスごとに一度だけ）"""
+    global _warm_up_thread
+    config = get_config()
+    model_names = sorted(
+        {
+            model_name
+            for analysis_type in ANALYSIS_TYPES
+            for model_name in config.tiers_for(analysis_type)
+        }
+    )
+    with _lock:
+        if _warm_up_thread is not None:
+            return _warm_up_thread
+        _warm_up_thread = threading.Thread(
+            target=_warm_up, args=(model_names,), name="gemini-warm-up", daemon=True
+        )
+    if background:
+        _warm_up_thread.start()
+    else:
+        _warm_up_thread.run()
+    return _warm_up_thread
@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable
+
+from src.backend.models.gemini_client import get_config, get_model, request_options
+from src.backend.models.usage import ReportUsage, estimate_tokens
+
+# ヘッジ判定に使うレイテンシの保持件数と、判定を始める最小件数
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+HEDGE_PERCENTILE = 0.95
+# ヘッジリクエストのタイムアウト（p95レイテンシに対する倍率）
+HEDGE_TIMEOUT_FACTOR = 3.0
+
+_executor_lock = threading.Lock()
+_executor: tuple[int, ThreadPoolExecutor] | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """モデル呼び出しを実行する共有スレッドプール（設定のcall_concurrencyで作成）"""
+    global _executor
+    workers = get_config().call_concurrency
+    with _executor_lock:
+        if _executor is None or _executor[0] != workers:
+            previous = _executor
+            _executor = (
+                workers,
+                ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="gemini-call"
+                ),
+            )
+            if previous is not None:
+                # 実行中の呼び出しは完了させ、新しい呼び出しは新しいプールで実行する
+                previous[1].shutdown(wait=False)
+        return _executor[1]
+
+
+class DeadlineExceeded(TimeoutError):
+    """呼び出しまたはレポートの期限切れ"""
+
+
+class Deadline:
+    """呼び出し全体の期限（Noneの場合は無期限）"""
+
+    def __init__(self, seconds: float | None):
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> float | None:
+        """残り時間（秒）を返す"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+
+class LatencyTracker:
+    """分析タイプ・モデルごとの直近レイテンシを保持する"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._window = window
+        self._samples: dict[tuple[str, str], deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: tuple[str, str], seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.setdefault(key, deque(maxlen=self._window))
+            samples.append(seconds)
+
+    def percentile(
+        self,
+        key: tuple[str, str],
+        q: float = HEDGE_PERCENTILE,
+        min_samples: int = MIN_LATENCY_SAMPLES,
+    ) -> float | None:
+        """指定パーセンタイルのレイテンシ（サンプル不足の場合はNone）"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class HedgeBudget:
+    """ヘッジリクエストが全リクエストの一定割合を超えないように制限する"""
+
+    def __init__(self):
+        self.requests = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def try_acquire(self, ratio: float) -> bool:
+        """ヘッジを1件追加してよければTrueを返す"""
+        with self._lock:
+            if self.hedges + 1 > ratio * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+
+latency_tracker = LatencyTracker()
+hedge_budget = HedgeBudget()
+
+
+def _timed_call(call: Callable[[float | None], Any], timeout: float | None):
+    started = time.monotonic()
+    result = call(timeout)
+    return result, time.monotonic() - started
+
+
+def generate_with_hedge(
+    analysis_type: str,
+    contents,
+    *,
+    model_name: str | None = None,
+    deadline: Deadline | None = None,
+    validate: Callable[[Any], Any] | None = None,
+    usage: ReportUsage | None = None,
+    generation_config: dict | None = None,
+):
+    """期限付きでgenerate_contentを実行し、遅い場合はヘッジリクエストを送る
+
+    呼び出しが分析タイプのp95レイテンシを超えた場合、予算の範囲内で同じリクエストを
+    もう一度送信し、先に妥当な応答を返した方を採用する（負けた側は中断できず、
+    タイムアウトまで実行され続ける）。validateが例外を送出した
+    応答は妥当でないとみなす。期限内に妥当な応答が得られない場合はDeadlineExceededを送出する。
+    usageを渡した場合は、採用しなかった応答も含め受信した全ての応答のトークン使用量を記録する。
+    generation_configを渡した場合はモデルの生成設定を上書きする。
+    """
+    config = get_config()
+    model = get_model(analysis_type, model_name=model_name)
+    key = (analysis_type, model.model_name)
+    validate = validate or (lambda response: response.text)
+
+    timeout = config.timeout
+    if deadline is not None:
+        remaining = deadline.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded(f"{analysis_type}: レポートの期限を超過しました")
+            timeout = min(timeout, remaining) if timeout else remaining
+    call_deadline = Deadline(timeout)
+
+    overrides = {"generation_config": generation_config} if generation_config else {}
+
+    def call(call_timeout):
+        response = model.generate_content(
+            contents, request_options=request_options(call_timeout), **overrides
+        )
+        # 検証に失敗した応答やヘッジで負けた応答も、消費したトークンは記録する
+        if usage is not None:
+            usage.record(
+                analysis_type,
+                getattr(response, "usage_metadata", None),
+                estimate_tokens(contents),
+            )
+        validate(response)
+        return response
+
+    executor = _get_executor()
+    hedge_budget.record_request()
+    started = time.monotonic()
+    pending: set[Future] = {executor.submit(_timed_call, call, timeout)}
+    hedge_after = latency_tracker.percentile(key)
+    hedged = not (config.hedge_budget > 0 and hedge_after is not None)
+    last_error: Exception | None = None
+
+    try:
+        while pending:
+            wait_for = call_deadline.remaining()
+            if not hedged:
+                hedge_wait = max(0.0, hedge_after - (time.monotonic() - started))
+                wait_for = hedge_wait if wait_for is None else min(wait_for, hedge_wait)
+
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response, seconds = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                latency_tracker.record(key, seconds)
+                return response
+
+            if call_deadline.expired:
+                break
+            if not hedged and time.monotonic() - started >= hedge_after:
+                hedged = True
+                if hedge_budget.try_acquire(config.hedge_budget):
+                    # ヘッジ側が負けた場合に早く終わるよう、タイムアウトをp95の数倍に抑える
+                    hedge_timeout = HEDGE_TIMEOUT_FACTOR * hedge_after
+                    remaining = call_deadline.remaining()
+                    if remaining is not None:
+                        hedge_timeout = min(hedge_timeout, remaining)
+                    pending.add(executor.submit(_timed_call, call, hedge_timeout))
+    finally:
+        # 負けた側のリクエストは破棄する。ただしFuture.cancel()は開始前の呼び出しにしか
+        # 効かず、送信済みのリクエストは中断できない。実行中の呼び出しは応答を受信するか
+        # タイムアウト（元のリクエストはtimeout、ヘッジはp95のHEDGE_TIMEOUT_FACTOR倍）
+        # まで、スレッドプールのワーカーと接続を1つずつ使い続ける。
+        for future in pending:
+            future.cancel()
+
+    if last_error is not None and not call_deadline.expired:
+        raise last_error
+    raise DeadlineExceeded(
+        f"{analysis_type}: 呼び出しの期限を超過しました"
+    ) from last_error
@@ -0,0 +1,184 @@
+import dataclasses
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from src.backend.models.pdf_handler import PdfImage
+from src.backend.models.prompts import AnalysisHint
+
+# 特徴量を計算する縮小画像の最大辺（ピクセル）
+SAMPLE_SIDE = 256
+# 顕著度・余白の分布を集計するグリッドの分割数
+GRID = 4
+# 輝度の勾配がこれを超える画素を輪郭とみなす
+EDGE_THRESHOLD = 0.08
+# 輝度の勾配がこれ未満の画素を平坦（余白）とみなす
+FLAT_THRESHOLD = 0.02
+# 画像のハッシュごとにキャッシュする件数
+CACHE_SIZE = 512
+
+# 特徴量を送る分析タイプ
+FEATURE_ANALYSES = ("visual_analysis",)
+
+
+@dataclasses.dataclass(frozen=True)
+class ImageFeatures:
+    """画像の特徴量（0〜1の値はすべて画像全体または各セルに対する割合）"""
+
+    # 輪郭（輝度の勾配が大きい画素）の割合
+    edge_density: float
+    # 輪郭と周囲との輝度差から求めた顕著度（GRID×GRID、最大値で正規化）
+    saliency: tuple[tuple[float, ...], ...]
+    # 明るい部分と暗い部分（輝度の95・5パーセンタイル）のコントラスト比（1〜21）
+    contrast_ratio: float
+    # 輝度の標準偏差
+    rms_contrast: float
+    # 平坦な領域（余白）の割合と分布（GRID×GRID）
+    whitespace: float
+    whitespace_grid: tuple[tuple[float, ...], ...]
+    # 輝度ヒストグラムのエントロピー（ビット）と差分ハッシュ（64ビット）
+    entropy: float
+    dhash: int
+
+    def to_dict(self) -> dict:
+        return dataclasses.asdict(self)
+
+
+def _grid(values: np.ndarray) -> tuple[tuple[float, ...], ...]:
+    return tuple(
+        tuple(
+            round(float(cell.mean()), 3) if cell.size else 0.0
+            for cell in np.array_split(band, GRID, axis=1)
+        )
+        for band in np.array_split(values, GRID, axis=0)
+    )
+
+
+def _compute(data: bytes) -> ImageFeatures:
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEGはデコード時に縮小して読み込む
+        image.draft("RGB", (SAMPLE_SIDE, SAMPLE_SIDE))
+        rgb = image.convert("RGB")
+    rgb.thumbnail((SAMPLE_SIDE, SAMPLE_SIDE))
+    pixels = np.asarray(rgb, dtype=np.float32) / 255.0
+
+    gray = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    # コントラスト比はsRGBを線形化した相対輝度で求める
+    linear = np.where(
+        pixels <= 0.04045, pixels / 12.92, ((pixels + 0.055) / 1.055) ** 2.4
+    )
+    luminance = linear @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+    dark, light = np.percentile(luminance, [5, 95])
+
+    # 縦横の差分から輝度の勾配を求める（末尾の行・列は除く）
+    gradient = (
+        np.abs(np.diff(gray, axis=1))[:-1, :] + np.abs(np.diff(gray, axis=0))[:, :-1]
+    )
+    if gradient.size == 0:
+        gradient = np.zeros((1, 1), dtype=np.float32)
+    edges = gradient > EDGE_THRESHOLD
+    flat = gradient < FLAT_THRESHOLD
+    deviation = np.abs(gray - gray.mean())[: gradient.shape[0], : gradient.shape[1]]
+    saliency = np.array(_grid(0.5 * edges + 0.5 * deviation))
+    peak = saliency.max()
+
+    histogram = np.bincount((gray * 255).astype(np.uint8).ravel(), minlength=256)
+    probabilities = histogram[histogram > 0] / histogram.sum()
+
+    hash_pixels = np.asarray(rgb.convert("L").resize((9, 8)), dtype=np.int16)
+    bits = (hash_pixels[:, :-1] > hash_pixels[:, 1:]).ravel()
+
+    return ImageFeatures(
+        edge_density=round(float(edges.mean()), 3),
+        saliency=tuple(
+            tuple(round(float(value / peak), 3) if peak else 0.0 for value in row)
+            for row in saliency
+        ),
+        contrast_ratio=round(float((light + 0.05) / (dark + 0.05)), 2),
+        rms_contrast=round(float(gray.std()), 3),
+        whitespace=round(float(flat.mean()), 3),
+        whitespace_grid=_grid(flat),
+        entropy=round(float(-(probabilities * np.log2(probabilities)).sum()), 3),
+        dhash=int("".join("1" if bit else "0" for bit in bits), 2),
+    )
+
+
+_lock = threading.Lock()
+_cache: OrderedDict[str, ImageFeatures] = OrderedDict()
+
+
+def image_features(data: bytes) -> ImageFeatures:
+    """画像の特徴量を計算する（画像のハッシュごとにキャッシュ）"""
+    key = hashlib.sha256(data).hexdigest()
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    features = _compute(data)
+    with _lock:
+        _cache[key] = features
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return features
+
+
+def _digits(grid: tuple[tuple[float, ...], ...]) -> str:
+    # 各セルを0〜9の1桁で表し、行を"/"で区切る
+    return "/".join("".join(str(round(value * 9)) for value in row) for row in grid)
+
+
+def describe(features: ImageFeatures, text_fraction: float | None = None) -> str:
+    """特徴量をプロンプトに添える1行の要約にする"""
+    items = [
+        f"輪郭密度 {features.edge_density:.2f}",
+        f"顕著度{GRID}x{GRID} {_digits(features.saliency)}",
+        f"コントラスト比 {features.contrast_ratio:.1f}:1",
+        f"RMSコントラスト {features.rms_contrast:.2f}",
+    ]
+    if text_fraction is not None:
+        items.append(f"テキスト面積 {text_fraction:.2f}")
+    items += [
+        f"余白 {features.whitespace:.2f}",
+        f"余白{GRID}x{GRID} {_digits(features.whitespace_grid)}",
+    ]
+    return ", ".join(items)
+
+
+def _hint(lines: list[str]) -> AnalysisHint:
+    return AnalysisHint(
+        text="\n".join(
+            [
+                "[画像の特徴量（ローカルで計算した参考値。グリッドは上の行から、0〜9）]",
+                *lines,
+                "レイアウト・階層・視認性のスコアは、これらの値と整合するように評価してください。",
+            ]
+        ),
+        analysis_types=FEATURE_ANALYSES,
+    )
+
+
+def feature_hint(images: list[PdfImage]) -> AnalysisHint | None:
+    """PDFの画像の特徴量を、視覚分析のプロンプトに添えるヒントにする"""
+    lines = []
+    for index, image in enumerate(images, 1):
+        try:
+            features = image_features(image.data)
+        except Exception:
+            continue
+        label = f"画像{index}（{image.page}ページ・{image.number}番目）"
+        lines.append(f"{label}: {describe(features, image.text_fraction)}")
+    return _hint(lines) if lines else None
+
+
+def bytes_feature_hint(image_bytes: bytes) -> AnalysisHint | None:
+    """配置情報のない画像（バイト列のみ）の特徴量のヒント"""
+    try:
+        features = image_features(image_bytes)
+    except Exception:
+        return None
+    return _hint([f"画像1: {describe(features)}"])
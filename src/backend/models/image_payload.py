@@ -0,0 +1,27 @@
+import io
+
+from PIL import Image
+
+# 予算が逼迫したときに送信する画像の最大辺（ピクセル）
+DOWNSCALE_MAX_SIDE = 768
+
+
+def image_part(data: bytes) -> dict:
+    """画像のバイト列をモデルに送るパーツ（mime_type付き）に変換する"""
+    with Image.open(io.BytesIO(data)) as image:
+        mime_type = Image.MIME.get(image.format, "image/png")
+    return {"mime_type": mime_type, "data": data}
+
+
+def downscale_part(part, max_side: int = DOWNSCALE_MAX_SIDE):
+    """画像パーツを最大辺max_sideまで縮小する（テキストや小さい画像はそのまま）"""
+    if not isinstance(part, dict) or "data" not in part:
+        return part
+    with Image.open(io.BytesIO(part["data"])) as image:
+        if max(image.size) <= max_side:
+            return part
+        image = image.convert("RGB")
+        image.thumbnail((max_side, max_side))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=85)
+    return {"mime_type": "image/jpeg", "data": buffer.getvalue()}
@@ -0,0 +1,138 @@
+import dataclasses
+import math
+
+from src.backend.models.image_features import ImageFeatures, image_features
+from src.backend.models.pdf_handler import PdfImage
+
+# 短辺がこれ未満の画像はアイコンとして除外
+MIN_SIDE = 48
+# 縦横比がこれを超える画像は罫線・帯として除外
+MAX_ASPECT = 8.0
+# 輝度のエントロピー（ビット）がこれ未満の画像は単色の塗りとして除外
+MIN_ENTROPY = 1.0
+# 複数ページに出現し、表示面積がこの割合未満の画像はロゴとして除外
+LOGO_MAX_COVERAGE = 0.1
+# 差分ハッシュのハミング距離がこれ以下なら同じ画像とみなす
+DUPLICATE_DISTANCE = 4
+# 面積のスコアが上限になる画素数
+REFERENCE_AREA = 1500 * 1500
+# 表示面積のスコアが上限になるページ面積の割合
+REFERENCE_COVERAGE = 0.5
+# 輪郭密度のスコアが上限になる値（写真や作り込まれたビジュアル）
+REFERENCE_EDGE_DENSITY = 0.3
+
+
+@dataclasses.dataclass(frozen=True)
+class RankedImage:
+    """代表画像の選定に使うスコアと除外理由"""
+
+    image: PdfImage
+    score: float
+    features: ImageFeatures
+    # 除外した理由（"icon" / "rule" / "flat" / "duplicate" / "logo"、採用候補ならNone）
+    rejected: str | None = None
+
+
+def _score(image: PdfImage, entropy: float, edge_density: float) -> float:
+    area = max(image.width * image.height, 1)
+    return (
+        0.35 * min(math.log(area) / math.log(REFERENCE_AREA), 1.0)
+        + 0.35 * min(image.coverage / REFERENCE_COVERAGE, 1.0)
+        + 0.15 * entropy / 8
+        + 0.15 * min(edge_density / REFERENCE_EDGE_DENSITY, 1.0)
+    )
+
+
+def _rejection(image: PdfImage, entropy: float) -> str | None:
+    short_side, long_side = sorted((image.width, image.height))
+    if long_side / max(short_side, 1) > MAX_ASPECT:
+        return "rule"
+    if short_side < MIN_SIDE:
+        return "icon"
+    if entropy < MIN_ENTROPY:
+        return "flat"
+    return None
+
+
+def rank_images(images: list[PdfImage]) -> list[RankedImage]:
+    """PDFの画像をスコアの高い順に並べ、分析に不要な画像に除外理由を付ける
+
+    メタデータと縮小画像の特徴量のみで判定する。デコードできない画像は含めない。
+    """
+    sampled = []
+    for image in images:
+        try:
+            sampled.append((image, image_features(image.data)))
+        except Exception:
+            continue
+
+    # 同じ画像（同じxref、またはハッシュが近いもの）をまとめる
+    # 単色に近い画像はハッシュがほぼ0になるため、xrefでのみ同一視する
+    clusters: list[list[tuple[PdfImage, ImageFeatures]]] = []
+    for item in sampled:
+        image, features = item
+        for cluster in clusters:
+            first, first_features = cluster[0]
+            if first.xref == image.xref or (
+                min(features.entropy, first_features.entropy) >= MIN_ENTROPY
+                and (first_features.dhash ^ features.dhash).bit_count()
+                <= DUPLICATE_DISTANCE
+            ):
+                cluster.append(item)
+                break
+        else:
+            clusters.append([item])
+
+    ranked = []
+    for cluster in clusters:
+        # 最も大きく配置されたものを代表とし、残りは重複として除外する
+        scored = sorted(
+            (
+                RankedImage(
+                    image,
+                    _score(image, features.entropy, features.edge_density),
+                    features,
+                )
+                for image, features in cluster
+            ),
+            key=lambda item: item.score,
+            reverse=True,
+        )
+        best, *duplicates = scored
+        rejected = _rejection(best.image, best.features.entropy)
+        pages = {item.image.page for item in scored}
+        if (
+            rejected is None
+            and len(pages) > 1
+            and best.image.coverage < LOGO_MAX_COVERAGE
+        ):
+            rejected = "logo"
+        ranked.append(dataclasses.replace(best, rejected=rejected))
+        ranked.extend(
+            dataclasses.replace(item, rejected="duplicate") for item in duplicates
+        )
+    ranked.sort(key=lambda item: item.score, reverse=True)
+    return ranked
+
+
+def select_images(
+    images: list[PdfImage], top_k: int, per_page: bool = False
+) -> list[PdfImage]:
+    """代表画像をスコアの高い順に最大top_k枚（per_pageの場合はページごとにtop_k枚）選ぶ
+
+    採用候補が1枚もない場合は、重複を除いて最もスコアの高い画像を1枚返す。
+    """
+    ranked = rank_images(images)
+    candidates = [item.image for item in ranked if item.rejected is None]
+    if not candidates:
+        candidates = [item.image for item in ranked if item.rejected != "duplicate"][:1]
+
+    if not per_page:
+        return candidates[:top_k]
+    selected = []
+    counts: dict[int, int] = {}
+    for image in candidates:
+        if counts.get(image.page, 0) < top_k:
+            counts[image.page] = counts.get(image.page, 0) + 1
+            selected.append(image)
+    return selected
@@ -0,0 +1,113 @@
+import json
+import re
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+_CLOSERS = {"{": "}", "[": "]"}
+_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+# 配列の要素の先頭として妥当なもの（末尾のカンマの後の閉じ括弧を含む）
+_VALUE_START = re.compile(r'\s*(?:["{\[\]}\-\d]|(?:true|false|null)\b|$)')
+
+
+def _closes_string(text: str, start: int, container: str | None) -> bool:
+    """startの直前の引用符が文字列の終わりかどうかを、後に続く文字から判定する
+
+    カンマが続く場合は、その後にオブジェクトならキー、配列なら値が始まるときだけ
+    終わりとみなす（"a "b", c" のような文字列内の引用符に対応する）。
+    """
+    rest = text[start:].lstrip()
+    if not rest or rest[0] in ":}]":
+        return True
+    if rest[0] != ",":
+        return False
+    after = rest[1:].lstrip()
+    if container == "}":
+        return not after or after[0] in '"}]'
+    return bool(_VALUE_START.match(after))
+
+
+def _strip_trailing_comma(out: list[str]) -> None:
+    while out and (out[-1].isspace() or out[-1] == ","):
+        out.pop()
+
+
+def repair_json(text: str) -> str:
+    """モデル出力によくあるJSONの崩れを修復する
+
+    コードフェンス、末尾のカンマ、文字列内のエスケープされていない引用符や改行、
+    途中で切れた出力（閉じ括弧の欠落）に対応する。途中で切れた場合は、最後に
+    完結していた要素までを残して括弧を閉じる。
+    """
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("JSONが見つかりません")
+    text = text[min(starts) :]
+
+    out: list[str] = []
+    stack: list[str] = []
+    # 途中で切れた場合に戻る位置（出力の長さと、その時点の括弧のスタック）
+    safe_point = (0, [])
+    in_string = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if ch == "\\" and i + 1 < len(text):
+                out.append(text[i : i + 2])
+                i += 2
+                continue
+            if ch == '"':
+                # 直後が区切り文字でない引用符は文字列の一部とみなす
+                if _closes_string(text, i + 1, stack[-1] if stack else None):
+                    in_string = False
+                    out.append(ch)
+                else:
+                    out.append('\\"')
+            else:
+                out.append(_ESCAPES.get(ch, ch))
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+            out.append(ch)
+            safe_point = (len(out), list(stack))
+        elif ch in "}]":
+            if not stack:
+                break
+            _strip_trailing_comma(out)
+            out.append(stack.pop())
+            if not stack:
+                return "".join(out)
+            safe_point = (len(out), list(stack))
+        elif ch == ",":
+            _strip_trailing_comma(out)
+            safe_point = (len(out), list(stack))
+            out.append(ch)
+        else:
+            out.append(ch)
+        i += 1
+
+    # 途中で切れた出力：まず最後の値を閉じて試し、だめなら完結していた位置まで戻る
+    if in_string:
+        out.append('"')
+    _strip_trailing_comma(out)
+    candidate = "".join(out) + "".join(reversed(stack))
+    try:
+        json.loads(candidate)
+        return candidate
+    except json.JSONDecodeError:
+        length, stack = safe_point
+        out = out[:length]
+        _strip_trailing_comma(out)
+        return "".join(out) + "".join(reversed(stack))
+
+
+def parse_json(text: str):
+    """JSONとして解析し、失敗した場合は修復してから解析する"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(repair_json(text))
@@ -0,0 +1,169 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+
+from src.backend.models.gemini_client import ANALYSIS_TYPES, get_config
+from src.backend.models.hedging import Deadline
+from src.backend.models.report import run_report
+from src.backend.models.schemas import RESPONSE_SCHEMAS
+from src.backend.models.usage import ReportUsage
+
+# 統合後の配列に残す最大件数（複数ページで共通する項目を優先）
+MAX_MERGED_ITEMS = 10
+
+
+def group_pages(page_inputs: list[list], group_size: int = 1) -> list[tuple[str, list]]:
+    """ページごとの入力をgroup_sizeページずつまとめる（入力のないページは除く）
+
+    戻り値は（ページラベル, 入力）のリスト。ラベルは"3"や"4-6"のような1始まりの番号。
+    """
+    groups = []
+    for start in range(0, len(page_inputs), group_size):
+        chunk = page_inputs[start : start + group_size]
+        inputs = [part for page in chunk for part in page]
+        if not inputs:
+            continue
+        end = start + len(chunk)
+        label = str(start + 1) if end == start + 1 else f"{start + 1}-{end}"
+        groups.append((label, inputs))
+    return groups
+
+
+def _item_key(item, key_field: str | None) -> str:
+    if key_field and isinstance(item, dict) and isinstance(item.get(key_field), str):
+        return item[key_field]
+    return repr(item)
+
+
+def _merge(values: list, schema: dict):
+    """スキーマに従って複数ページの値を1つにまとめる
+
+    スコアは平均、文章は最頻値、配列は重複をまとめて出現ページ数の多い順に残す。
+    """
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+
+    schema_type = schema["type"]
+    if schema_type == "OBJECT":
+        objects = [value for value in values if isinstance(value, dict)]
+        if not objects:
+            return values[0]
+        keys = dict.fromkeys(key for value in objects for key in value)
+        return {
+            # スキーマにないフィールド（旧形式のキーなど）は文字列として扱う
+            key: _merge(
+                [value.get(key) for value in objects],
+                schema["properties"].get(key, {"type": "STRING"}),
+            )
+            for key in keys
+        }
+    if schema_type == "ARRAY":
+        items = [item for value in values if isinstance(value, list) for item in value]
+        item_schema = schema["items"]
+        # オブジェクトの配列は最初の文字列フィールド（色名や示唆など）で同一視する
+        key_field = next(
+            (
+                key
+                for key, child in item_schema.get("properties", {}).items()
+                if child["type"] == "STRING"
+            ),
+            None,
+        )
+        groups: dict[str, list] = {}
+        for item in items:
+            groups.setdefault(_item_key(item, key_field), []).append(item)
+        ranked = sorted(groups.values(), key=len, reverse=True)
+        return [_merge(group, item_schema) for group in ranked[:MAX_MERGED_ITEMS]]
+    if schema_type in ("INTEGER", "NUMBER"):
+        numbers = [
+            value
+            for value in values
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        ]
+        if not numbers:
+            return values[0]
+        mean = sum(numbers) / len(numbers)
+        return round(mean) if schema_type == "INTEGER" else round(mean, 1)
+    texts = [value for value in values if isinstance(value, str)]
+    return Counter(texts).most_common(1)[0][0] if texts else values[0]
+
+
+def reduce_results(analysis_type: str, page_results: list[dict | None]):
+    """ページごとの分析結果を既存のレポート形式に統合する（モデル呼び出しなし）"""
+    return _merge(page_results, RESPONSE_SCHEMAS[analysis_type])
+
+
+def _page_reports(groups: list[tuple[str, list]], pages: list[dict]) -> list[dict]:
+    return [
+        {"label": label, "results": page["results"], "errors": page["errors"]}
+        for (label, _), page in zip(groups, pages)
+    ]
+
+
+def run_pages(
+    prompts: dict[str, str],
+    groups: list[tuple[str, list]],
+    analysis_types: tuple[str, ...] = ANALYSIS_TYPES,
+    deadline: Deadline | None = None,
+    usage: ReportUsage | None = None,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> dict:
+    """ページ（グループ）ごとに並列で分析し、結果を1つのレポートに統合する
+
+    mapは同時実行数max_concurrencyまで並列に実行する。on_progressは呼び出し元の
+    スレッドから（完了したグループ数, 総数）で呼ばれる。
+    戻り値はrun_reportの形式に、ページごとの結果"pages"を加えたもの。
+    """
+    pages: list[dict | None] = [None] * len(groups)
+    max_workers = max(1, min(get_config().max_concurrency, len(groups)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                run_report,
+                prompts,
+                inputs,
+                analysis_types=analysis_types,
+                deadline=deadline,
+                usage=usage,
+            ): index
+            for index, (_, inputs) in enumerate(groups)
+        }
+        for completed, future in enumerate(as_completed(futures), 1):
+            pages[futures[future]] = future.result()
+            if on_progress:
+                on_progress(completed, len(groups))
+
+    if len(pages) == 1:
+        # 1グループのみの場合は統合せずそのまま返す
+        return {**pages[0], "pages": _page_reports(groups, pages)}
+
+    results = {}
+    errors = {}
+    for analysis_type in analysis_types:
+        page_results = [page["results"][analysis_type] for page in pages]
+        results[analysis_type] = reduce_results(analysis_type, page_results)
+        failed = [
+            label
+            for (label, _), page in zip(groups, pages)
+            if analysis_type in page["errors"]
+        ]
+        if failed and results[analysis_type] is None:
+            errors[analysis_type] = next(
+                page["errors"][analysis_type]
+                for page in pages
+                if analysis_type in page["errors"]
+            )
+        elif failed:
+            errors[analysis_type] = (
+                f"ページ {', '.join(failed)} の分析が完了しなかったため、残りのページから集計しました"
+            )
+
+    report = {
+        "results": results,
+        "errors": errors,
+        "pages": _page_reports(groups, pages),
+    }
+    if usage is not None:
+        report["usage"] = usage.summary()
+    return report
@@ -1,31 +1,125 @@
-import tempfile
-import fitz
 import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import fitz
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 
 
-def extract_image_bytes(pdf_file: UploadedFile) -> list[bytes]:
+@dataclass(frozen=True)
+class PdfImage:
+    """PDFから抽出した画像とその配置情報"""
+
+    data: bytes
+    page: int  # ページ番号（1から始まる）
+    number: int  # ページ内の画像番号（1から始まる）
+    xref: int
+    width: int
+    height: int
+    # ページ面積に対する表示面積の割合（同じ画像を複数回配置した場合は合計）
+    coverage: float
+    # 表示領域のうちテキストブロックと重なる面積の割合
+    text_fraction: float = 0.0
+
+
+@dataclass(frozen=True)
+class PdfContent:
+    """PDFのページごとのテキストと画像"""
+
+    page_texts: list[str]
+    images: list[PdfImage]
+
+
+@contextmanager
+def open_pdf(pdf_file: UploadedFile | str):
+    """PDFをコピーせずに開く（ファイルパス、またはアップロードされたファイル）"""
+    if isinstance(pdf_file, (str, os.PathLike)):
+        pdf_doc = fitz.open(pdf_file)
+    else:
+        # UploadedFile（BytesIO）はアップロードされたバイト列をコピーオンライトで共有しており、
+        # getvalue()はコピーせずに同じオブジェクトを返す（getbuffer()は共有を解除してコピーする）
+        data = pdf_file.getvalue() if hasattr(pdf_file, "getvalue") else pdf_file.read()
+        pdf_doc = fitz.open(stream=data, filetype="pdf")
+
+    try:
+        yield pdf_doc
+    finally:
+        pdf_doc.close()
+
+
+def _page_images(
+    pdf_doc, page, page_number: int, extracted: dict[int, dict | None]
+) -> list[PdfImage]:
+    """ページの画像を抽出する（extractedはxrefごとの抽出結果のキャッシュ）"""
+    images = []
+    page_area = abs(page.rect) or 1.0
+    # テキストブロック（種類0）の領域
+    text_blocks = [
+        fitz.Rect(block[:4]) for block in page.get_text("blocks") if block[6] == 0
+    ]
+    for number, image in enumerate(page.get_images(), 1):
+        xref = image[0]
+        # 複数ページに配置された画像（ロゴなど）は1回だけ抽出し、同じバイト列を共有する
+        if xref not in extracted:
+            extracted[xref] = pdf_doc.extract_image(xref)
+        base_image = extracted[xref]
+        if base_image:
+            rects = page.get_image_rects(xref)
+            shown_area = sum(abs(rect) for rect in rects)
+            text_area = sum(
+                abs(rect & block) for rect in rects for block in text_blocks
+            )
+            images.append(
+                PdfImage(
+                    data=base_image["image"],
+                    page=page_number,
+                    number=number,
+                    xref=xref,
+                    width=base_image["width"],
+                    height=base_image["height"],
+                    coverage=min(shown_area / page_area, 1.0),
+                    text_fraction=(
+                        min(text_area / shown_area, 1.0) if shown_area else 0.0
+                    ),
+                )
+            )
+    return images
+
+
+def extract_pdf(pdf_file: UploadedFile | str) -> PdfContent:
+    """PDFからページごとのテキストと画像を1回の読み込みで抽出"""
+    page_texts = []
+    images = []
+    extracted = {}
+    with open_pdf(pdf_file) as pdf_doc:
+        for page_number, page in enumerate(pdf_doc, 1):
+            page_texts.append(page.get_text())
+            images.extend(_page_images(pdf_doc, page, page_number, extracted))
+    return PdfContent(page_texts=page_texts, images=images)
+
+
+def extract_images(pdf_file: UploadedFile | str) -> list[PdfImage]:
+    """PDFから画像を配置情報付きで抽出"""
+    extracted = {}
+    with open_pdf(pdf_file) as pdf_doc:
+        return [
+            image
+            for page_number, page in enumerate(pdf_doc, 1)
+            for image in _page_images(pdf_doc, page, page_number, extracted)
+        ]
+
+
+def group_by_page(images: list[PdfImage]) -> list[list[PdfImage]]:
+    """画像をページごとのリストにまとめる（画像のないページは空のリスト）"""
+    page_images = [[] for _ in range(max((image.page for image in images), default=0))]
+    for image in images:
+        page_images[image.page - 1].append(image)
+    return page_images
+
+
+def extract_image_bytes(pdf_file: UploadedFile | str) -> list[bytes]:
     """PDFから画像をバイト列のリストとして抽出"""
-    extract_bytes = []
-    # アップロードされたファイルを一時的に保存
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-        temp_pdf.write(pdf_file.getvalue())
-        temp_path = temp_pdf.name
-
-    # 保存したファイルを開く
-    pdf_doc = fitz.open(temp_path)
-
-    for page in pdf_doc:
-        for image in page.get_images():
-            xref = image[0]
-            base_image = pdf_doc.extract_image(xref)
-            if base_image:
-                extract_bytes.append(base_image["image"])
-
-    # クリーンアップ
-    pdf_doc.close()
-    os.unlink(temp_path)
-    return extract_bytes
+    return [image.data for image in extract_images(pdf_file)]
 
 
 # import streamlit as st
@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+
+# プロンプトを変更した場合は更新する（キャッシュや記録済み応答のキーに含まれる）
+PROMPT_VERSION = "2"
+
+# 出力項目はresponse_schemaで指定するため、プロンプトには分析の観点だけを書く
+_INSTRUCTIONS = {
+    "visual_analysis": "視覚的な要素（レイアウト、注目ポイント、視線の流れ）を専門家の視点で、具体的な数値やエビデンスを含めて分析してください。",
+    "color_analysis": "色使いを色彩心理学の観点から、各色の効果や印象を含めて分析してください。",
+    "overall_impression": "全体的な印象をマーケティング効果と消費者心理の観点から総合的に分析してください。",
+    "marketing_analysis": "マーケティング戦略を4P・消費者行動・競合の観点から分析し、実践的な示唆を示してください。",
+}
+_RULES = "日本語で簡潔に、スコアは0-100の整数で回答してください。"
+
+# 入力の種類ごとの前置きと、入力の直前に置く見出し
+_SOURCES = {
+    "text": ("以下の広告分析テキストから、", "\n分析テキスト:\n"),
+    "image": ("添付の広告画像について、", ""),
+}
+
+
+def _compile(source: str) -> dict[str, str]:
+    prefix, suffix = _SOURCES[source]
+    return {
+        analysis_type: f"{prefix}{instruction}{_RULES}{suffix}"
+        for analysis_type, instruction in _INSTRUCTIONS.items()
+    }
+
+
+# 分析テキストを続けて送るプロンプト / 画像を続けて送るプロンプト
+TEXT_PROMPTS = _compile("text")
+IMAGE_PROMPTS = _compile("image")
+
+
+@dataclass(frozen=True)
+class AnalysisHint:
+    """入力に含め、指定した分析タイプにだけテキストとして送る補助情報（画像の特徴量など）"""
+
+    text: str
+    analysis_types: tuple[str, ...]
+
+
+def parts_for(analysis_types, inputs: list) -> list:
+    """入力から、分析タイプに送るパーツを取り出す（対象外のヒントは除く）"""
+    return [
+        (part.text if isinstance(part, AnalysisHint) else part)
+        for part in inputs
+        if not isinstance(part, AnalysisHint)
+        or any(t in part.analysis_types for t in analysis_types)
+    ]
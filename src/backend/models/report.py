@@ -0,0 +1,101 @@
+from typing import Callable
+
+from src.backend.models.cascade import run_cascade, run_combined
+from src.backend.models.gemini_client import ANALYSIS_TYPES
+from src.backend.models.hedging import Deadline, DeadlineExceeded
+from src.backend.models.image_payload import downscale_part
+from src.backend.models.prompts import parts_for
+from src.backend.models.usage import (
+    DEGRADE_COMBINE,
+    DEGRADE_DOWNSCALE,
+    DEGRADE_SKIP_OPTIONAL,
+    ReportUsage,
+    estimate_tokens,
+)
+
+# トークン予算が逼迫した場合に省略する分析
+OPTIONAL_ANALYSES = ("color_analysis", "marketing_analysis")
+
+
+def run_report(
+    prompts: dict[str, str],
+    inputs: list,
+    analysis_types: tuple[str, ...] = ANALYSIS_TYPES,
+    deadline: Deadline | None = None,
+    usage: ReportUsage | None = None,
+    on_progress: Callable[[str | None, int, int], None] | None = None,
+) -> dict:
+    """1ドキュメント分の分析をまとめて実行する
+
+    promptsは分析タイプごとのプロンプト、inputsはプロンプトの後に続けて送るパーツ
+    （分析テキストや画像。AnalysisHintは対象の分析タイプにだけ送る）。
+    usageに予算が設定されている場合は、消費率に応じて画像の縮小・プロンプトの統合・任意分析の省略の順に品質を下げる。
+    on_progressは各分析の開始前と完了時に（次の分析タイプ, 完了数, 総数）で呼ばれる。
+    """
+    results = {analysis_type: None for analysis_type in analysis_types}
+    errors: dict[str, str] = {}
+    pending = list(analysis_types)
+    completed = 0
+
+    while pending:
+        degradations = set()
+        if usage is not None:
+            projected = sum(
+                estimate_tokens(
+                    [prompts[analysis_type], *parts_for((analysis_type,), inputs)]
+                )
+                for analysis_type in pending
+            )
+            degradations = usage.plan(projected)
+
+        if DEGRADE_SKIP_OPTIONAL in degradations:
+            for analysis_type in [t for t in pending if t in OPTIONAL_ANALYSES]:
+                errors[analysis_type] = "トークン予算の上限が近いため省略しました"
+                pending.remove(analysis_type)
+                completed += 1
+            if not pending:
+                break
+
+        parts = inputs
+        if DEGRADE_DOWNSCALE in degradations:
+            parts = [downscale_part(part) for part in inputs]
+
+        if DEGRADE_COMBINE in degradations and len(pending) > 1:
+            batch, pending = pending, []
+        else:
+            batch = [pending.pop(0)]
+
+        if on_progress:
+            on_progress(batch[0], completed, len(analysis_types))
+        try:
+            if len(batch) > 1:
+                combined, combined_errors = run_combined(
+                    {t: prompts[t] for t in batch},
+                    parts_for(batch, parts),
+                    deadline,
+                    usage,
+                )
+                results.update(combined)
+                errors.update(combined_errors)
+            else:
+                results[batch[0]] = run_cascade(
+                    batch[0],
+                    [prompts[batch[0]], *parts_for(batch, parts)],
+                    deadline,
+                    usage,
+                )
+        except DeadlineExceeded as e:
+            for analysis_type in batch:
+                errors[analysis_type] = f"期限内に分析が完了しませんでした: {e}"
+        except Exception as e:
+            for analysis_type in batch:
+                errors[analysis_type] = f"分析中にエラーが発生しました: {e}"
+        completed += len(batch)
+
+    if on_progress:
+        on_progress(None, completed, len(analysis_types))
+
+    report = {"results": results, "errors": errors}
+    if usage is not None:
+        report["usage"] = usage.summary()
+    return report
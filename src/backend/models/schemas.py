@@ -0,0 +1,204 @@
+from dataclasses import dataclass
+
+
+def _string() -> dict:
+    return {"type": "STRING"}
+
+
+def _score() -> dict:
+    # 0-100のスコア
+    return {"type": "INTEGER"}
+
+
+def _number() -> dict:
+    return {"type": "NUMBER"}
+
+
+def _list(items: dict | None = None) -> dict:
+    return {"type": "ARRAY", "items": items or _string()}
+
+
+def _object(**properties: dict) -> dict:
+    return {
+        "type": "OBJECT",
+        "properties": properties,
+        "required": list(properties),
+    }
+
+
+def _four_p(position_key: str) -> dict:
+    # 4Pの各要素（位置づけを表すキーは要素ごとに異なる）
+    return _object(
+        current_status=_string(), **{position_key: _string()}, suggestions=_list()
+    )
+
+
+# 各分析タイプの応答スキーマ（Geminiのresponse_schemaと同じOpenAPIサブセット形式）
+RESPONSE_SCHEMAS: dict[str, dict] = {
+    "visual_analysis": _object(
+        key_points=_list(),
+        attention_areas=_list(),
+        attention_flow=_object(
+            first_view=_string(), second_view=_string(), final_view=_string()
+        ),
+        effectiveness_score=_score(),
+        element_scores=_object(
+            layout=_score(), hierarchy=_score(), visibility=_score()
+        ),
+        recommendations=_list(),
+    ),
+    "color_analysis": _object(
+        dominant_colors=_list(
+            _object(
+                color=_string(), percentage=_number(), psychological_effect=_string()
+            )
+        ),
+        color_scheme=_object(
+            type=_string(), effectiveness=_score(), harmony_description=_string()
+        ),
+        psychological_effects=_list(),
+        target_audience_impact=_object(
+            age_groups=_list(), gender_appeal=_list(), cultural_factors=_list()
+        ),
+        color_harmony_score=_score(),
+        suggestions=_list(),
+    ),
+    "overall_impression": _object(
+        impressions=_list(
+            _object(aspect=_string(), score=_score(), description=_string())
+        ),
+        target_audience=_object(
+            primary=_list(), secondary=_list(), engagement_level=_score()
+        ),
+        strengths=_list(),
+        weaknesses=_list(),
+        market_fit=_object(score=_score(), reasons=_list()),
+        overall_score=_score(),
+        future_potential=_list(),
+    ),
+    "marketing_analysis": _object(
+        marketing_4p=_object(
+            product=_four_p("competitive_position"),
+            price=_four_p("market_positioning"),
+            place=_four_p("channel_effectiveness"),
+            promotion=_four_p("communication_effectiveness"),
+        ),
+        consumer_journey=_object(
+            awareness=_object(score=_score(), touchpoints=_list(), insights=_list()),
+            consideration=_object(
+                score=_score(), decision_factors=_list(), insights=_list()
+            ),
+            purchase=_object(score=_score(), triggers=_list(), insights=_list()),
+        ),
+        competitive_analysis=_object(
+            market_position=_string(),
+            unique_selling_points=_list(),
+            threat_level=_score(),
+            opportunities=_list(),
+        ),
+        actionable_insights=_list(
+            _object(insight=_string(), priority=_score(), expected_impact=_string())
+        ),
+        next_steps=_list(
+            _object(action=_string(), timeline=_string(), expected_outcome=_string())
+        ),
+    ),
+}
+
+
+@dataclass(frozen=True)
+class QualityHeuristics:
+    """スキーマ以外の品質判定（満たさない応答は上位モデルへエスカレーションする）"""
+
+    # 配列の最小要素数
+    min_list_items: int = 1
+    # 文字列の最小文字数
+    min_text_length: int = 1
+    # 全てのスコアが同じ値の応答を低品質とみなす
+    reject_uniform_scores: bool = True
+
+
+DEFAULT_HEURISTICS = QualityHeuristics()
+
+
+def _check(value, schema: dict, path: str, heuristics, problems, scores) -> None:
+    schema_type = schema["type"]
+    if schema_type == "OBJECT":
+        if not isinstance(value, dict):
+            problems.append(f"{path}: オブジェクトではありません")
+            return
+        for key in schema.get("required", ()):
+            if key not in value:
+                problems.append(f"{path}.{key}: 必須フィールドがありません")
+        for key, child in schema["properties"].items():
+            if key in value:
+                _check(value[key], child, f"{path}.{key}", heuristics, problems, scores)
+    elif schema_type == "ARRAY":
+        if not isinstance(value, list):
+            problems.append(f"{path}: 配列ではありません")
+            return
+        if len(value) < heuristics.min_list_items:
+            problems.append(f"{path}: 要素数が不足しています")
+        for i, item in enumerate(value):
+            _check(item, schema["items"], f"{path}[{i}]", heuristics, problems, scores)
+    elif schema_type in ("INTEGER", "NUMBER"):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            problems.append(f"{path}: 数値ではありません")
+        elif not 0 <= value <= 100:
+            problems.append(f"{path}: 0-100の範囲外です")
+        elif schema_type == "INTEGER":
+            scores.append(value)
+    elif schema_type == "STRING":
+        if not isinstance(value, str):
+            problems.append(f"{path}: 文字列ではありません")
+        elif len(value.strip()) < heuristics.min_text_length:
+            problems.append(f"{path}: 内容が不足しています")
+
+
+def validate_analysis(
+    analysis_type: str,
+    data,
+    heuristics: QualityHeuristics = DEFAULT_HEURISTICS,
+) -> list[str]:
+    """分析結果をスキーマと品質判定で検証し、問題点のリストを返す（空なら合格）"""
+    problems: list[str] = []
+    scores: list[float] = []
+    _check(data, RESPONSE_SCHEMAS[analysis_type], "$", heuristics, problems, scores)
+    if heuristics.reject_uniform_scores and len(scores) > 1 and len(set(scores)) == 1:
+        problems.append("$: 全てのスコアが同じ値です")
+    return problems
+
+
+def incomplete_fields(
+    analysis_type: str,
+    data,
+    heuristics: QualityHeuristics = DEFAULT_HEURISTICS,
+) -> list[str]:
+    """欠落しているか検証に失敗したトップレベルのフィールド名を返す"""
+    schema = RESPONSE_SCHEMAS[analysis_type]
+    if not isinstance(data, dict):
+        return list(schema["properties"])
+    fields = []
+    for key, child in schema["properties"].items():
+        problems: list[str] = []
+        if key in data:
+            _check(data[key], child, f"$.{key}", heuristics, problems, [])
+        if key not in data or problems:
+            fields.append(key)
+    return fields
+
+
+def subset_schema(analysis_type: str, fields: list[str]) -> dict:
+    """指定したトップレベルのフィールドだけを含むスキーマを返す"""
+    properties = RESPONSE_SCHEMAS[analysis_type]["properties"]
+    return _object(**{key: properties[key] for key in fields})
+
+
+def combined_schema(analysis_types: list[str]) -> dict:
+    """複数の分析を分析タイプ名をキーとしてまとめたスキーマを返す"""
+    return _object(
+        **{
+            analysis_type: RESPONSE_SCHEMAS[analysis_type]
+            for analysis_type in analysis_types
+        }
+    )
@@ -0,0 +1,147 @@
+import datetime
+import threading
+from collections import defaultdict
+
+# Gemini 1.5は画像1枚を一律258トークンとして数える
+IMAGE_TOKENS = 258
+
+# 予算の消費率に応じた品質の段階的な引き下げ
+DEGRADE_DOWNSCALE = "downscale_images"
+DEGRADE_COMBINE = "combine_prompts"
+DEGRADE_SKIP_OPTIONAL = "skip_optional"
+DEGRADATION_THRESHOLDS = (
+    (0.5, DEGRADE_DOWNSCALE),
+    (0.7, DEGRADE_COMBINE),
+    (0.9, DEGRADE_SKIP_OPTIONAL),
+)
+
+
+def estimate_tokens(contents) -> int:
+    """送信前にリクエストのトークン数を概算する
+
+    英数字は約4文字で1トークン、日本語などはおおむね1文字1トークンとして数える。
+    """
+    if isinstance(contents, str):
+        ascii_chars = sum(1 for ch in contents if ch.isascii())
+        return ascii_chars // 4 + (len(contents) - ascii_chars)
+    if isinstance(contents, (list, tuple)):
+        return sum(estimate_tokens(part) for part in contents)
+    # 画像（バイト列・mime_type付きdict・PIL画像）
+    return IMAGE_TOKENS
+
+
+def _token_counts(usage_metadata) -> tuple[int, int]:
+    if usage_metadata is None:
+        return 0, 0
+    return (
+        getattr(usage_metadata, "prompt_token_count", 0) or 0,
+        getattr(usage_metadata, "candidates_token_count", 0) or 0,
+    )
+
+
+class DailyLedger:
+    """プロセス全体の日別・セッション別のトークン使用量"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._days: dict[str, int] = defaultdict(int)
+        self._sessions: dict[str, int] = defaultdict(int)
+
+    def add(self, session_id: str | None, tokens: int) -> None:
+        with self._lock:
+            self._days[datetime.date.today().isoformat()] += tokens
+            if session_id:
+                self._sessions[session_id] += tokens
+
+    def today(self) -> int:
+        with self._lock:
+            return self._days[datetime.date.today().isoformat()]
+
+    def session(self, session_id: str) -> int:
+        with self._lock:
+            return self._sessions[session_id]
+
+
+daily_ledger = DailyLedger()
+
+
+class ReportUsage:
+    """1レポート（1ドキュメント）分のトークン使用量と予算"""
+
+    def __init__(
+        self,
+        document_id: str,
+        session_id: str | None = None,
+        report_budget: int | None = None,
+        daily_budget: int | None = None,
+        ledger: DailyLedger = daily_ledger,
+    ):
+        self.document_id = document_id
+        self.session_id = session_id
+        self.report_budget = report_budget
+        self.daily_budget = daily_budget
+        self.ledger = ledger
+        self.degradations: set[str] = set()
+        self._lock = threading.Lock()
+        self._by_analysis: dict[str, dict] = defaultdict(
+            lambda: {
+                "calls": 0,
+                "estimated_tokens": 0,
+                "prompt_tokens": 0,
+                "output_tokens": 0,
+            }
+        )
+
+    def record(
+        self,
+        analysis_type: str,
+        usage_metadata,
+        estimated_tokens: int = 0,
+    ) -> None:
+        """応答のusage_metadataを分析タイプごとに記録する"""
+        prompt_tokens, output_tokens = _token_counts(usage_metadata)
+        with self._lock:
+            stats = self._by_analysis[analysis_type]
+            stats["calls"] += 1
+            stats["estimated_tokens"] += estimated_tokens
+            stats["prompt_tokens"] += prompt_tokens
+            stats["output_tokens"] += output_tokens
+        self.ledger.add(self.session_id, prompt_tokens + output_tokens)
+
+    @property
+    def total_tokens(self) -> int:
+        with self._lock:
+            return sum(
+                stats["prompt_tokens"] + stats["output_tokens"]
+                for stats in self._by_analysis.values()
+            )
+
+    def plan(self, projected_tokens: int) -> set[str]:
+        """これから送る見込みのトークン数を加えた予算消費率から、品質の引き下げを決める"""
+        ratios = []
+        if self.report_budget:
+            ratios.append((self.total_tokens + projected_tokens) / self.report_budget)
+        if self.daily_budget:
+            ratios.append((self.ledger.today() + projected_tokens) / self.daily_budget)
+        ratio = max(ratios, default=0.0)
+        degradations = {
+            name for limit, name in DEGRADATION_THRESHOLDS if ratio >= limit
+        }
+        self.degradations |= degradations
+        return degradations
+
+    def summary(self) -> dict:
+        """レポートやUIに出力する集計"""
+        with self._lock:
+            by_analysis = {key: dict(stats) for key, stats in self._by_analysis.items()}
+        prompt_tokens = sum(s["prompt_tokens"] for s in by_analysis.values())
+        output_tokens = sum(s["output_tokens"] for s in by_analysis.values())
+        return {
+            "document_id": self.document_id,
+            "session_id": self.session_id,
+            "prompt_tokens": prompt_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": prompt_tokens + output_tokens,
+            "by_analysis": by_analysis,
+            "degradations": sorted(self.degradations),
+        }
@@ -0,0 +1,184 @@
+import copy
+import json
+
+import pytest
+
+from src.backend.models import cascade, hedging
+from src.backend.models.cascade import TierStats, run_cascade
+from src.backend.models.gemini_client import ClientConfig
+from src.backend.models.hedging import HedgeBudget, LatencyTracker
+from src.backend.models.schemas import QualityHeuristics
+
+FAST_MODEL = "fast-model"
+MAIN_MODEL = "main-model"
+
+VALID_COLOR = {
+    "dominant_colors": [
+        {"color": "赤", "percentage": 40.0, "psychological_effect": "情熱"},
+    ],
+    "color_scheme": {
+        "type": "補色",
+        "effectiveness": 72,
+        "harmony_description": "赤と緑の補色",
+    },
+    "psychological_effects": ["活力"],
+    "target_audience_impact": {
+        "age_groups": ["20代"],
+        "gender_appeal": ["女性"],
+        "cultural_factors": ["祝祭"],
+    },
+    "color_harmony_score": 81,
+    "suggestions": ["余白を増やす"],
+}
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeModel:
+    """モデルごとに決めた応答を返す"""
+
+    def __init__(self, model_name, text):
+        self.model_name = model_name
+        self.text = text
+        self.calls = 0
+
+    def generate_content(self, contents, request_options=None, **kwargs):
+        self.calls += 1
+        return FakeResponse(self.text)
+
+
+@pytest.fixture
+def models(monkeypatch):
+    """高速モデル→本来のモデルの2階層のカスケードを用意し、応答を差し替える"""
+    config = ClientConfig(
+        default_model=MAIN_MODEL, cascade=(FAST_MODEL,), hedge_budget=0.0
+    )
+    monkeypatch.setattr(cascade, "get_config", lambda: config)
+    monkeypatch.setattr(hedging, "get_config", lambda: config)
+    monkeypatch.setattr(hedging, "latency_tracker", LatencyTracker())
+    monkeypatch.setattr(hedging, "hedge_budget", HedgeBudget())
+    monkeypatch.setattr(cascade, "tier_stats", TierStats())
+
+    installed = {}
+
+    def install(fast, main):
+        installed[FAST_MODEL] = FakeModel(FAST_MODEL, fast)
+        installed[MAIN_MODEL] = FakeModel(MAIN_MODEL, main)
+        monkeypatch.setattr(
+            hedging,
+            "get_model",
+            lambda analysis_type=None, model_name=None: installed[model_name],
+        )
+        return installed
+
+    return install
+
+
+def _without(key):
+    data = copy.deepcopy(VALID_COLOR)
+    del data[key]
+    return json.dumps(data)
+
+
+def _stats():
+    return {
+        item["model"]: (item["attempts"], item["accepted"], item["escalated"])
+        for item in cascade.tier_stats.snapshot()
+    }
+
+
+def test_fast_tier_accepted(models):
+    installed = models(json.dumps(VALID_COLOR), "{}")
+
+    assert run_cascade("color_analysis", ["prompt"]) == VALID_COLOR
+    assert installed[MAIN_MODEL].calls == 0
+    assert _stats() == {FAST_MODEL: (1, 1, 0)}
+
+
+def test_escalates_on_schema_miss(models):
+    installed = models(_without("color_scheme"), json.dumps(VALID_COLOR))
+
+    assert run_cascade("color_analysis", ["prompt"]) == VALID_COLOR
+    assert installed[FAST_MODEL].calls == 1
+    assert installed[MAIN_MODEL].calls == 1
+    assert _stats() == {FAST_MODEL: (1, 0, 1), MAIN_MODEL: (1, 1, 0)}
+
+
+def test_escalates_on_heuristics_miss(models):
+    # スキーマは満たすが、配列が空の応答
+    thin = copy.deepcopy(VALID_COLOR)
+    thin["suggestions"] = []
+    installed = models(json.dumps(thin), json.dumps(VALID_COLOR))
+
+    assert run_cascade("color_analysis", ["prompt"]) == VALID_COLOR
+    assert installed[MAIN_MODEL].calls == 1
+    assert _stats()[FAST_MODEL] == (1, 0, 1)
+
+
+def test_heuristics_are_configurable(models):
+    thin = copy.deepcopy(VALID_COLOR)
+    thin["suggestions"] = []
+    installed = models(json.dumps(thin), json.dumps(VALID_COLOR))
+
+    result = run_cascade(
+        "color_analysis", ["prompt"], heuristics=QualityHeuristics(min_list_items=0)
+    )
+
+    assert result == thin
+    assert installed[MAIN_MODEL].calls == 0
+
+
+def test_heuristics_from_env(monkeypatch):
+    monkeypatch.setenv("GEMINI_MIN_LIST_ITEMS", "2")
+    monkeypatch.setenv("GEMINI_REJECT_UNIFORM_SCORES", "false")
+
+    heuristics = ClientConfig.from_env().heuristics
+
+    assert heuristics == QualityHeuristics(
+        min_list_items=2, min_text_length=1, reject_uniform_scores=False
+    )
+
+
+def test_escalates_on_json_failure(models):
+    installed = models("申し訳ありませんが、出力できません", json.dumps(VALID_COLOR))
+
+    assert run_cascade("color_analysis", ["prompt"]) == VALID_COLOR
+    assert installed[FAST_MODEL].calls == 1
+    assert _stats() == {FAST_MODEL: (1, 0, 1), MAIN_MODEL: (1, 1, 0)}
+
+
+def test_last_tier_returns_invalid_result(models):
+    incomplete = _without("suggestions")
+    installed = models(incomplete, incomplete)
+
+    result = run_cascade("color_analysis", ["prompt"])
+
+    assert "suggestions" not in result
+    assert result["color_harmony_score"] == 81
+    # 最後の階層では欠落フィールドだけを1回再リクエストする
+    assert installed[MAIN_MODEL].calls == 2
+    assert _stats() == {FAST_MODEL: (1, 0, 1), MAIN_MODEL: (1, 1, 0)}
+
+
+def test_last_tier_json_failure_raises(models):
+    models("not json", "not json")
+
+    with pytest.raises(ValueError):
+        run_cascade("color_analysis", ["prompt"])
+    assert _stats() == {FAST_MODEL: (1, 0, 1), MAIN_MODEL: (1, 0, 1)}
+
+
+def test_tier_stats_snapshot_rates():
+    stats = TierStats()
+    stats.record("color_analysis", FAST_MODEL, True, 1.0)
+    stats.record("color_analysis", FAST_MODEL, False, 3.0)
+
+    (item,) = stats.snapshot()
+
+    assert item["attempts"] == 2
+    assert item["hit_rate"] == 0.5
+    assert item["avg_seconds"] == 2.0
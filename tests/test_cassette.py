@@ -0,0 +1,118 @@
+import time
+
+import pytest
+from google.generativeai import protos
+from google.generativeai.types.generation_types import GenerateContentResponse
+
+from src.backend.models.cassette import (
+    CassetteMiss,
+    CassetteModel,
+    CassetteStore,
+    fingerprint,
+)
+
+MODEL_NAME = "models/fake-model"
+IMAGE = b"\x89PNG fake image bytes"
+
+
+def _response(text):
+    return GenerateContentResponse.from_response(
+        protos.GenerateContentResponse(
+            {
+                "candidates": [
+                    {"content": {"parts": [{"text": text}], "role": "model"}}
+                ],
+                "usage_metadata": {
+                    "prompt_token_count": 5,
+                    "candidates_token_count": 3,
+                    "total_token_count": 8,
+                },
+            }
+        )
+    )
+
+
+class FakeModel:
+    model_name = MODEL_NAME
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def generate_content(self, contents, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return _response(f'{{"call": {self.calls}}}')
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CassetteStore(str(tmp_path / "cassettes" / "gemini.sqlite3"))
+
+
+def test_fingerprint_is_stable_across_buffer_types():
+    contents = ["prompt", {"mime_type": "image/png", "data": IMAGE}]
+    key = fingerprint(MODEL_NAME, {"temperature": 0.2}, contents)
+
+    for data in (bytearray(IMAGE), memoryview(IMAGE)):
+        same = ["prompt", {"data": data, "mime_type": "image/png"}]
+        assert fingerprint(MODEL_NAME, {"temperature": 0.2}, same) == key
+    assert fingerprint(MODEL_NAME, {"temperature": 0.2}, contents) == key
+
+
+def test_fingerprint_changes_with_request():
+    contents = ["prompt", {"mime_type": "image/png", "data": IMAGE}]
+    key = fingerprint(MODEL_NAME, {}, contents)
+
+    assert fingerprint("models/other", {}, contents) != key
+    assert fingerprint(MODEL_NAME, {"temperature": 0.2}, contents) != key
+    assert fingerprint(MODEL_NAME, {}, ["prompt 2", contents[1]]) != key
+    other_image = {"mime_type": "image/png", "data": IMAGE + b"!"}
+    assert fingerprint(MODEL_NAME, {}, ["prompt", other_image]) != key
+
+
+def test_record_then_replay(store):
+    inner = FakeModel()
+    recorder = CassetteModel(inner, store, "record", generation_config={"x": 1})
+    recorded = recorder.generate_content(["prompt", {"data": IMAGE}])
+
+    # 再生時は元のモデルを呼ばない
+    player = CassetteModel(
+        FakeModel(), store, "replay", speed=0, generation_config={"x": 1}
+    )
+    replayed = player.generate_content(["prompt", {"data": memoryview(IMAGE)}])
+
+    assert inner.calls == 1
+    assert player._model.calls == 0
+    assert replayed.text == recorded.text
+    assert replayed.usage_metadata.total_token_count == 8
+
+
+def test_replay_miss_raises(store):
+    CassetteModel(FakeModel(), store, "record").generate_content(["prompt"])
+    player = CassetteModel(FakeModel(), store, "replay", speed=0)
+
+    with pytest.raises(CassetteMiss):
+        player.generate_content(["another prompt"])
+    with pytest.raises(CassetteMiss):
+        player.generate_content(["prompt"], generation_config={"temperature": 1.0})
+
+
+def test_replay_speed(store):
+    CassetteModel(FakeModel(delay=0.2), store, "record").generate_content(["prompt"])
+
+    started = time.monotonic()
+    CassetteModel(FakeModel(), store, "replay", speed=0).generate_content(["prompt"])
+    assert time.monotonic() - started < 0.1
+
+    started = time.monotonic()
+    CassetteModel(FakeModel(), store, "replay", speed=2).generate_content(["prompt"])
+    assert 0.09 <= time.monotonic() - started < 0.2
+
+
+def test_store_persists_between_connections(tmp_path):
+    path = str(tmp_path / "gemini.sqlite3")
+    CassetteStore(path).put("key", MODEL_NAME, {"candidates": []}, 0.5)
+
+    assert CassetteStore(path).get("key") == ({"candidates": []}, 0.5)
+    assert CassetteStore(path).get("missing") is None
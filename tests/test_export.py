@@ -0,0 +1,160 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from src.backend.export import (
+    SCORE_COLUMNS,
+    TABLE_COLUMNS,
+    available_compressions,
+    available_formats,
+    export_reports,
+    file_name,
+    infer_format,
+)
+
+REPORTS = [
+    {
+        "document": "a.pdf",
+        "results": {
+            "visual_analysis": {"effectiveness_score": 80},
+            "color_analysis": {"color_harmony_score": 65},
+        },
+        "errors": {},
+        "usage": {"total_tokens": 1200},
+        "pages": [
+            {
+                "label": "1",
+                "results": {"visual_analysis": {"effectiveness_score": 70}},
+                "errors": {},
+            },
+            {
+                "label": "2",
+                "results": {"visual_analysis": {"effectiveness_score": 90}},
+                "errors": {"color_analysis": "期限切れ"},
+            },
+        ],
+    },
+    {
+        "document": "壊れた.pdf",
+        "results": {},
+        "errors": {"_document": "Failed to open file"},
+    },
+]
+
+CASES = [
+    (export_format, compression)
+    for export_format in available_formats()
+    for compression in (None, *available_compressions())
+]
+
+
+def _decompress(data: bytes, compression: str | None) -> bytes:
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)).read()
+    return data
+
+
+def _export(export_format, compression, **kwargs) -> bytes:
+    out = io.BytesIO()
+    # ジェネレータから1件ずつ書き出せること
+    count = export_reports(
+        (report for report in REPORTS), out, export_format, compression, **kwargs
+    )
+    assert count == len(REPORTS)
+    assert not out.closed
+    return out.getvalue()
+
+
+def _read_table(data: bytes, export_format, compression) -> list[dict]:
+    if export_format == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_table(io.BytesIO(data)).to_pylist()
+    text = _decompress(data, compression).decode("utf-8")
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+@pytest.mark.parametrize("export_format, compression", CASES)
+def test_round_trip(export_format, compression):
+    data = _export(
+        export_format, compression, summary=lambda: {"usage": {"total_tokens": 1200}}
+    )
+
+    if export_format == "jsonl":
+        lines = _decompress(data, compression).decode("utf-8").splitlines()
+        assert [json.loads(line) for line in lines] == REPORTS
+    elif export_format == "json":
+        document = json.loads(_decompress(data, compression))
+        assert document == {"reports": REPORTS, "usage": {"total_tokens": 1200}}
+    else:
+        rows = _read_table(data, export_format, compression)
+        assert list(rows[0]) == list(TABLE_COLUMNS)
+        # 統合結果の行と、複数ページのドキュメントのページ別の行
+        assert [(row["document"], row["page"]) for row in rows] == [
+            ("a.pdf", ""),
+            ("a.pdf", "1"),
+            ("a.pdf", "2"),
+            ("壊れた.pdf", ""),
+        ]
+        scores = [row["visual_analysis.effectiveness_score"] for row in rows]
+        assert [float(score) if score else None for score in scores] == [
+            80.0,
+            70.0,
+            90.0,
+            None,
+        ]
+        assert [int(row["errors"]) for row in rows] == [0, 0, 1, 1]
+        assert int(rows[0]["total_tokens"]) == 1200
+
+
+def test_empty_json_export_is_valid():
+    out = io.BytesIO()
+    assert export_reports(iter(()), out, "json") == 0
+    assert json.loads(out.getvalue()) == {"reports": []}
+
+
+def test_score_columns_cover_nested_scores():
+    assert SCORE_COLUMNS["visual_analysis.effectiveness_score"] == (
+        "visual_analysis",
+        "effectiveness_score",
+    )
+    assert "color_analysis.color_scheme.effectiveness" in SCORE_COLUMNS
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("reports.json", ("json", None)),
+        ("out/reports.jsonl.gz", ("jsonl", "gzip")),
+        ("scores.csv.zst", ("csv", "zstd")),
+        ("scores.parquet", ("parquet", None)),
+    ],
+)
+def test_infer_format(path, expected):
+    assert infer_format(path) == expected
+
+
+def test_infer_format_rejects_unknown_suffix():
+    with pytest.raises(ValueError):
+        infer_format("reports.txt")
+
+
+def test_invalid_format_and_compression():
+    with pytest.raises(ValueError):
+        export_reports(REPORTS, io.BytesIO(), "xml")
+    with pytest.raises(ValueError):
+        export_reports(REPORTS, io.BytesIO(), "jsonl", "brotli")
+
+
+def test_file_name():
+    assert file_name("analysis_report", "csv", "gzip") == "analysis_report.csv.gz"
+    assert file_name("analysis_report", "jsonl") == "analysis_report.jsonl"
+    # Parquetは列圧縮のため拡張子を付けない
+    assert file_name("analysis_report", "parquet", "zstd") == "analysis_report.parquet"
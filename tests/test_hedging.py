@@ -0,0 +1,181 @@
+import threading
+import time
+
+import pytest
+
+from src.backend.models import hedging
+from src.backend.models.gemini_client import ClientConfig
+from src.backend.models.hedging import (
+    Deadline,
+    DeadlineExceeded,
+    HedgeBudget,
+    LatencyTracker,
+    generate_with_hedge,
+)
+from src.backend.models.usage import ReportUsage
+
+MODEL_NAME = "fake-model"
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeModel:
+    """呼び出しごとに指定した秒数だけ待ってから応答を返すモデル"""
+
+    model_name = MODEL_NAME
+
+    def __init__(self, delays):
+        self.delays = list(delays)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, request_options=None, **kwargs):
+        with self._lock:
+            index = self.calls
+            self.calls += 1
+        time.sleep(self.delays[min(index, len(self.delays) - 1)])
+        return FakeResponse(f"call-{index}")
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """ヘッジ判定の状態をテストごとに初期化し、モデルを差し替える"""
+    config = ClientConfig(timeout=5.0, hedge_budget=1.0)
+    monkeypatch.setattr(hedging, "get_config", lambda: config)
+    monkeypatch.setattr(hedging, "latency_tracker", LatencyTracker())
+    monkeypatch.setattr(hedging, "hedge_budget", HedgeBudget())
+
+    def install(delays):
+        model = FakeModel(delays)
+        monkeypatch.setattr(hedging, "get_model", lambda *args, **kwargs: model)
+        return model
+
+    return install
+
+
+def _record_latency(seconds, count=hedging.MIN_LATENCY_SAMPLES):
+    for _ in range(count):
+        hedging.latency_tracker.record(("visual_analysis", MODEL_NAME), seconds)
+
+
+def test_percentile_needs_min_samples():
+    tracker = LatencyTracker()
+    key = ("visual_analysis", MODEL_NAME)
+    for seconds in range(hedging.MIN_LATENCY_SAMPLES - 1):
+        tracker.record(key, float(seconds))
+    assert tracker.percentile(key) is None
+
+    tracker.record(key, 100.0)
+    assert tracker.percentile(key) == 100.0
+
+
+def test_hedge_budget_limits_ratio():
+    budget = HedgeBudget()
+    for _ in range(10):
+        budget.record_request()
+    assert budget.try_acquire(0.1)
+    assert not budget.try_acquire(0.1)
+
+
+def test_no_hedge_without_latency_samples(fake):
+    model = fake([0.2])
+
+    response = generate_with_hedge("visual_analysis", "prompt")
+
+    assert response.text == "call-0"
+    assert model.calls == 1
+    assert hedging.hedge_budget.hedges == 0
+
+
+def test_hedges_after_p95_and_takes_first_response(fake):
+    # 1回目は遅く、ヘッジした2回目がすぐに返る
+    model = fake([2.0, 0.0])
+    _record_latency(0.05)
+
+    started = time.monotonic()
+    response = generate_with_hedge("visual_analysis", "prompt")
+    elapsed = time.monotonic() - started
+
+    assert response.text == "call-1"
+    assert model.calls == 2
+    assert hedging.hedge_budget.hedges == 1
+    assert 0.05 <= elapsed < 1.0
+
+
+def test_invalid_response_raises_validation_error(fake):
+    fake([0.0])
+
+    def validate(response):
+        raise ValueError("invalid")
+
+    with pytest.raises(ValueError):
+        generate_with_hedge("visual_analysis", "prompt", validate=validate)
+
+
+def test_call_timeout_raises_deadline_exceeded(fake):
+    fake([1.0])
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        generate_with_hedge("visual_analysis", "prompt", deadline=Deadline(0.1))
+    assert time.monotonic() - started < 0.5
+
+
+def test_expired_deadline_skips_call(fake):
+    model = fake([0.0])
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+
+    with pytest.raises(DeadlineExceeded):
+        generate_with_hedge("visual_analysis", "prompt", deadline=deadline)
+    assert model.calls == 0
+
+
+def test_executor_follows_call_concurrency(monkeypatch):
+    monkeypatch.setattr(hedging, "get_config", lambda: ClientConfig(call_concurrency=3))
+    executor = hedging._get_executor()
+    assert executor is hedging._get_executor()
+
+    monkeypatch.setattr(hedging, "get_config", lambda: ClientConfig(call_concurrency=5))
+    assert hedging._get_executor() is not executor
+
+
+def test_usage_records_rejected_and_losing_responses(fake):
+    model = fake([0.3, 0.0])
+    _record_latency(0.05)
+    usage = ReportUsage("document")
+
+    generate_with_hedge("visual_analysis", "prompt", usage=usage)
+    # 負けた側の応答が返るのを待つ
+    time.sleep(0.4)
+    assert model.calls == 2
+    assert usage.summary()["by_analysis"]["visual_analysis"]["calls"] == 2
+
+    def validate(response):
+        raise ValueError("invalid")
+
+    with pytest.raises(ValueError):
+        generate_with_hedge("visual_analysis", "prompt", validate=validate, usage=usage)
+    assert usage.summary()["by_analysis"]["visual_analysis"]["calls"] == 3
+
+
+def test_hedge_request_uses_short_timeout(fake, monkeypatch):
+    timeouts = []
+    model = fake([0.3, 0.0])
+    original = model.generate_content
+
+    def generate_content(contents, request_options=None, **kwargs):
+        timeouts.append(request_options.get("timeout"))
+        return original(contents, request_options=request_options, **kwargs)
+
+    monkeypatch.setattr(model, "generate_content", generate_content)
+    _record_latency(0.05)
+
+    generate_with_hedge("visual_analysis", "prompt")
+
+    assert timeouts[0] == 5.0
+    assert timeouts[1] == pytest.approx(hedging.HEDGE_TIMEOUT_FACTOR * 0.05)
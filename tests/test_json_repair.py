@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from src.backend.models.json_repair import parse_json, repair_json
+
+
+def test_valid_json_is_unchanged():
+    assert parse_json('{"a": 1, "b": [true, null]}') == {"a": 1, "b": [True, None]}
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '```json\n{"score": 80}\n```',
+        '```\n{"score": 80}\n```',
+        '結果は以下の通りです。\n```JSON\n{"score": 80}\n```\n以上です。',
+        '```json\n{"score": 80}',
+        '説明文 {"score": 80} 以上',
+    ],
+)
+def test_fenced_or_wrapped_output(text):
+    assert parse_json(text) == {"score": 80}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"a": 1,}', {"a": 1}),
+        ('{"a": [1, 2,], }', {"a": [1, 2]}),
+        ('{"a": ["x", "y",], "b": "z",}', {"a": ["x", "y"], "b": "z"}),
+        ('[{"a": 1},\n]', [{"a": 1}]),
+    ],
+)
+def test_trailing_commas(text, expected):
+    assert parse_json(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"a": 1, "b": {"c": 2', {"a": 1, "b": {"c": 2}}),
+        ('{"a": [1, 2, {"b": "x', {"a": [1, 2, {"b": "x"}]}),
+        ('{"a": "v",', {"a": "v"}),
+        # 途中で切れたキーは、最後に完結していた要素まで戻る
+        ('{"a": 1, "b', {"a": 1}),
+        ('{"a": 1, "b":', {"a": 1}),
+        ('{"items": [{"name": "x", "score": 7', {"items": [{"name": "x", "score": 7}]}),
+    ],
+)
+def test_truncated_objects(text, expected):
+    assert parse_json(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"k": "a "b", c"}', {"k": 'a "b", c'}),
+        ('{"k": "a "b" c", "n": 1}', {"k": 'a "b" c', "n": 1}),
+        ('["a "b", c", "d"]', ['a "b", c', "d"]),
+        ('{"k": "彼は"最高"と言った"}', {"k": '彼は"最高"と言った'}),
+    ],
+)
+def test_unescaped_quotes(text, expected):
+    assert parse_json(text) == expected
+
+
+def test_unescaped_newlines_in_strings():
+    assert parse_json('{"a": "line\nbreak\tend"}') == {"a": "line\nbreak\tend"}
+
+
+def test_repair_returns_valid_json():
+    repaired = repair_json('```json\n{"a": [1, 2,], "b": "x "y" z"\n```')
+    assert json.loads(repaired) == {"a": [1, 2], "b": 'x "y" z'}
+
+
+def test_text_without_json_raises():
+    with pytest.raises(ValueError):
+        parse_json("JSONを出力できませんでした")
@@ -0,0 +1,148 @@
+from src.backend.models import mapreduce
+from src.backend.models.mapreduce import (
+    MAX_MERGED_ITEMS,
+    group_pages,
+    reduce_results,
+    run_pages,
+)
+
+
+def _color(harmony, scheme_type, effectiveness, colors, suggestions):
+    return {
+        "dominant_colors": [
+            {"color": color, "percentage": percentage, "psychological_effect": effect}
+            for color, percentage, effect in colors
+        ],
+        "color_scheme": {
+            "type": scheme_type,
+            "effectiveness": effectiveness,
+            "harmony_description": f"{scheme_type}の配色",
+        },
+        "psychological_effects": ["安心感"],
+        "target_audience_impact": {
+            "age_groups": ["20代"],
+            "gender_appeal": ["女性"],
+            "cultural_factors": [],
+        },
+        "color_harmony_score": harmony,
+        "suggestions": suggestions,
+    }
+
+
+def test_group_pages_skips_empty_pages_and_labels_ranges():
+    pages = [["a"], [], ["c"], ["d"], ["e"]]
+
+    assert group_pages(pages) == [
+        ("1", ["a"]),
+        ("3", ["c"]),
+        ("4", ["d"]),
+        ("5", ["e"]),
+    ]
+    assert group_pages(pages, group_size=2) == [
+        ("1-2", ["a"]),
+        ("3-4", ["c", "d"]),
+        ("5", ["e"]),
+    ]
+
+
+def test_scores_are_averaged_across_pages():
+    merged = reduce_results(
+        "color_analysis",
+        [
+            _color(80, "補色", 70, [], []),
+            _color(61, "補色", 91, [], []),
+        ],
+    )
+
+    # INTEGERは平均を丸める
+    assert merged["color_harmony_score"] == 70
+    assert merged["color_scheme"]["effectiveness"] == 80
+
+
+def test_conflicting_text_takes_most_common_value():
+    merged = reduce_results(
+        "color_analysis",
+        [
+            _color(70, "補色", 70, [], []),
+            _color(70, "類似色", 70, [], []),
+            _color(70, "類似色", 70, [], []),
+        ],
+    )
+
+    assert merged["color_scheme"]["type"] == "類似色"
+
+
+def test_conflicting_array_items_are_grouped_by_key_and_ranked():
+    merged = reduce_results(
+        "color_analysis",
+        [
+            _color(
+                70, "補色", 70, [("赤", 40.0, "情熱"), ("白", 30.0, "清潔")], ["余白"]
+            ),
+            _color(
+                70, "補色", 70, [("赤", 20.0, "活力"), ("青", 50.0, "信頼")], ["余白"]
+            ),
+            _color(70, "補色", 70, [("赤", 30.0, "活力")], ["文字"]),
+        ],
+    )
+
+    colors = merged["dominant_colors"]
+    # 3ページに出現した赤が先頭、同じ色の数値は平均、説明は最頻値
+    assert colors[0] == {
+        "color": "赤",
+        "percentage": 30.0,
+        "psychological_effect": "活力",
+    }
+    assert {color["color"] for color in colors[1:]} == {"白", "青"}
+    assert merged["suggestions"] == ["余白", "文字"]
+
+
+def test_merged_arrays_are_capped():
+    pages = [
+        _color(70, "補色", 70, [], [f"提案{page}-{i}" for i in range(5)])
+        for page in range(4)
+    ]
+
+    merged = reduce_results("color_analysis", pages)
+
+    assert len(merged["suggestions"]) == MAX_MERGED_ITEMS
+
+
+def test_failed_pages_and_unknown_keys():
+    page = _color(70, "補色", 70, [], [])
+    merged = reduce_results(
+        "color_analysis",
+        [
+            None,
+            {**page, "legacy_note": "旧形式"},
+            {**page, "color_harmony_score": None},
+        ],
+    )
+
+    assert merged["color_harmony_score"] == 70
+    assert merged["legacy_note"] == "旧形式"
+    assert reduce_results("color_analysis", [None, None]) is None
+
+
+def test_run_pages_merges_and_reports_missing_pages(monkeypatch):
+    def fake_run_report(prompts, inputs, analysis_types, deadline=None, usage=None):
+        if inputs == ["bad"]:
+            return {
+                "results": {"color_analysis": None},
+                "errors": {"color_analysis": "期限内に分析が完了しませんでした"},
+            }
+        score = 60 if inputs == ["a"] else 80
+        return {
+            "results": {"color_analysis": _color(score, "補色", 70, [], [])},
+            "errors": {},
+        }
+
+    monkeypatch.setattr(mapreduce, "run_report", fake_run_report)
+    groups = group_pages([["a"], ["bad"], ["b"]])
+
+    report = run_pages({}, groups, analysis_types=("color_analysis",))
+
+    assert report["results"]["color_analysis"]["color_harmony_score"] == 70
+    assert "2" in report["errors"]["color_analysis"]
+    assert [page["label"] for page in report["pages"]] == ["1", "2", "3"]
+    assert report["pages"][1]["results"]["color_analysis"] is None